@@ -0,0 +1,162 @@
+"""Headless batch runner for parameter sweeps.
+
+Runs every combination of a sweep spec to completion in a process pool and writes
+one row of metrics per run:
+
+    python -m app.batch sweep.json --out results.npz --workers 8
+
+The spec is a JSON object; list-valued entries are swept over, scalars are shared
+by every run:
+
+    {
+        "seeds": [0, 1, 2],
+        "num_agents": [50, 100],
+        "num_obstacles": [1, 2],
+        "max_steps": 20000,
+        "backend": "numpy",
+        "scenario": "corridor",
+        "integrator": "verlet",
+        "dt": 0.05,
+        "adaptive": true
+    }
+
+`seeds` may also be a count n, meaning seeds RANDOM_SEED .. RANDOM_SEED + n - 1.
+`scenario` is the name of a scenario file in SIM_SCENARIO_DIR, or a scenario object.
+`max_steps` counts steps of `dt` simulated seconds; see `Simulation` for the
+integrator options.
+Results are written column by column to a `.npz` file, or to a `.csv` file.
+"""
+import argparse
+import csv
+import itertools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.models.scenario import Scenario
+from app.models.sim import DELTA_T, RANDOM_SEED, Simulation
+
+DEFAULT_MAX_STEPS = 20000
+
+COLUMNS = ("seed", "num_agents", "num_obstacles", "steps", "exited",
+           "evacuation_time", "exit_throughput", "force_evaluations", "init_wall_time",
+           "step_wall_time")
+
+
+def expand_spec(spec: dict) -> list[dict]:
+    """Expand a sweep spec into the parameters of every run.
+
+    Args:
+        spec (dict): sweep spec, see the module docstring.
+
+    Returns:
+        list[dict]: one dict of `run` keyword arguments per run.
+    """
+    seeds = spec.get("seeds", 1)
+    if isinstance(seeds, int):
+        seeds = list(range(RANDOM_SEED, RANDOM_SEED + seeds))
+    sweep = {
+        "seed": seeds,
+        "num_agents": spec.get("num_agents", [10]),
+        "num_obstacles": spec.get("num_obstacles", [1]),
+    }
+    sweep = {k: v if isinstance(v, list) else [v] for k, v in sweep.items()}
+    shared = {
+        "max_steps": spec.get("max_steps", DEFAULT_MAX_STEPS),
+        "backend": spec.get("backend", "auto"),
+        "scenario": spec.get("scenario"),
+        "integrator": spec.get("integrator", "euler"),
+        "dt": spec.get("dt", DELTA_T),
+        "adaptive": spec.get("adaptive", False),
+    }
+    return [dict(zip(sweep, values), **shared)
+            for values in itertools.product(*sweep.values())]
+
+
+def run(seed: int, num_agents: int, num_obstacles: int,
+        max_steps: int = DEFAULT_MAX_STEPS, backend: str = "auto",
+        scenario: dict | str | None = None, integrator: str = "euler",
+        dt: float = DELTA_T, adaptive: bool = False) -> dict:
+    """Run one simulation until every agent has exited or `max_steps` is reached.
+
+    `scenario` is a scenario name or its JSON form; None runs the default world.
+
+    Returns:
+        dict: the metrics of the run, keyed by `COLUMNS`.
+    """
+    if isinstance(scenario, str):
+        scenario = Scenario.named(scenario)
+    elif scenario is not None:
+        scenario = Scenario.from_dict(scenario)
+    start = time.perf_counter()
+    sim = Simulation(num_agents, num_obstacles, True, backend=backend, seed=seed,
+                     scenario=scenario, integrator=integrator, dt=dt, adaptive=adaptive)
+    init_wall_time = time.perf_counter() - start
+
+    steps = 0
+    start = time.perf_counter()
+    while steps < max_steps and not sim.finished:
+        sim.step()
+        steps += 1
+    step_wall_time = (time.perf_counter() - start) / max(steps, 1)
+
+    exited = int(sim.agent_state.exited.sum())
+    elapsed = sim.time
+    return {
+        "seed": seed,
+        "num_agents": num_agents,
+        "num_obstacles": num_obstacles,
+        "steps": steps,
+        "exited": exited,
+        # simulated seconds until the room was empty; nan if it never was
+        "evacuation_time": elapsed if sim.finished else float("nan"),
+        # agents through the exit per simulated second
+        "exit_throughput": exited / elapsed if elapsed > 0 else float("nan"),
+        # force evaluations of single agents, over every step and substep
+        "force_evaluations": sim.evaluations,
+        "init_wall_time": init_wall_time,
+        "step_wall_time": step_wall_time,
+    }
+
+
+def _run(params: dict) -> dict:
+    return run(**params)
+
+
+def run_sweep(spec: dict, workers: int | None = None) -> list[dict]:
+    """Run every combination of a sweep spec in a process pool."""
+    runs = expand_spec(spec)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_run, runs))
+
+
+def write_results(results: list[dict], path: str):
+    """Write run metrics column by column to a `.npz` or `.csv` file."""
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(results)
+        return
+    np.savez(path, **{column: np.array([r[column] for r in results]) for column in COLUMNS})
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("spec", help="path to the JSON sweep spec")
+    parser.add_argument("--out", default="results.npz", help="results file (.npz or .csv)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes; defaults to one per core")
+    args = parser.parse_args(argv)
+
+    with open(args.spec) as f:
+        spec = json.load(f)
+    results = run_sweep(spec, args.workers)
+    write_results(results, args.out)
+    print(f"wrote {len(results)} runs to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
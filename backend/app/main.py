@@ -1,33 +1,78 @@
 """FastAPI application module for the Social Force Model Simulation."""
-import uuid
+import asyncio
+import time
+from functools import partial
+from contextlib import asynccontextmanager
 import logging
 import uvicorn
 
 logger = logging.getLogger("uvicorn")
 
 
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
 
-from app.models.sim import Simulation
+from app import metrics
+from app.models.field_cache import field_cache
+from app.models.scenario import Scenario
+from app.models.sim import DELTA_T, Simulation
+from app.protocol import (DEFAULT_KEYFRAME_INTERVAL, PATH_IMAGE_FORMATS, PRECISIONS,
+                          PROTOCOLS, DeltaEncoder, encode_delta, encode_frame, encode_path_image)
+from app.recording import (Recorder, Recording, Replay, load_checkpoint, resolve,
+                           save_checkpoint)
+from app.runner import DEFAULT_FPS, DEFAULT_SUBSTEPS, SimulationRunner
+from app.sessions import TRY_AGAIN_LATER, AdmissionError, SessionManager, stop_runner
 from app.sim_dao import AgentDTO, ObstacleDTO, SimulationDAO
+from app.workers import StepPool
 
 class SimulationConfig(BaseModel):
     numAgents: int
     numObstacles: int
     state: bool
+    # a scenario in its JSON form, or the name of one in SIM_SCENARIO_DIR
+    scenario: dict | str | None = None
+    # time integration, see `Simulation`
+    integrator: str = "euler"
+    dt: float = DELTA_T
+    adaptive: bool = False
 
 
 class SimulationState(BaseModel):
     agents: list[AgentDTO]
     obstacles: list[ObstacleDTO]
     state: bool
+    scenario: dict | None = None
+    # token to resume the websocket session with, see `app.sessions`
+    session: str | None = None
 
 
-app = FastAPI()
+def load_scenario(config: SimulationConfig) -> Scenario | None:
+    """The scenario a config asks for; raises ValueError if it is invalid."""
+    if config.scenario is None:
+        return None
+    if isinstance(config.scenario, str):
+        return Scenario.named(config.scenario)
+    try:
+        return Scenario.from_dict(config.scenario)
+    except TypeError as e:
+        raise ValueError(f"Invalid scenario: {e}") from e
+
+
+step_pool = StepPool()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    sweeper = asyncio.create_task(sessions.run_sweeper())
+    yield
+    sweeper.cancel()
+    step_pool.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Add this route before mounting static files
 @app.get("/")
@@ -45,68 +90,322 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Store active WebSocket connections
-active_connections: dict[str, WebSocket] = {}
+# websocket sessions by token
+sessions = SessionManager()
 
 
 @app.post("/init")
 def init(config: SimulationConfig) -> SimulationState:
     """Initialize the simulation."""
-    sim = Simulation(config.numAgents, config.numObstacles, config.state)
-    sim.initialize()
+    try:
+        scenario = load_scenario(config)
+        sim = Simulation(config.numAgents, config.numObstacles, config.state,
+                         scenario=scenario, integrator=config.integrator, dt=config.dt,
+                         adaptive=config.adaptive)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     return SimulationState(
         agents=[SimulationDAO.map_agent_to_dto(agent) for agent in sim.agents],
         obstacles=[SimulationDAO.map_obstacle_to_dto(obstacle) for obstacle in sim.obstacles],
-        state=config.state
+        state=config.state,
+        scenario=sim.scenario.to_dict()
+    )
+
+
+def encode_step(session: dict) -> bytes | dict:
+    """Build the next frame of a session in its negotiated protocol."""
+    profiler = session["profiler"]
+    with profiler.stage("encode"):
+        frame = _encode_step(session)
+    if session.get("attach_metrics") and isinstance(frame, dict):
+        frame["metrics"] = profiler.summary()
+    return frame
+
+
+def _encode_step(session: dict) -> bytes | dict:
+    sim = session["simulation"]
+    session["frame"] += 1
+    delta = session["delta"]
+    indices = delta.update(sim) if delta is not None else None
+    if session["protocol"] == "binary":
+        if indices is not None:
+            return encode_delta(sim, session["frame"], indices, session["precision"])
+        return encode_frame(sim, session["frame"], session["precision"])
+    if indices is not None:
+        return {
+            "type": "simulation_delta",
+            "data": {
+                "agents": [SimulationDAO.map_agent_to_dto(sim.agents[i]).model_dump()
+                           for i in indices],
+                "state": sim.state
+            }
+        }
+    # agents that have exited are left out; the client only draws the others
+    state = SimulationState(
+        agents=[SimulationDAO.map_agent_to_dto(sim.agents[i])
+                for i in sim.active],
+        obstacles=[SimulationDAO.map_obstacle_to_dto(obstacle) 
+                   for obstacle in sim.obstacles],
+        state=sim.state
+    )
+    return {
+        "type": "simulation_state",
+        "data": state.model_dump()
+    }
+
+
+def resync_after_drop(session: dict):
+    """A dropped delta frame leaves the client behind; send a keyframe next."""
+    delta = session["delta"]
+    if delta is not None:
+        delta.force_keyframe = True
+
+
+def seek_and_encode(session: dict, frame: int) -> bytes | dict:
+    session["simulation"].seek(frame)
+    return encode_step(session)
+
+
+def step_and_encode(session: dict) -> bytes | dict:
+    with session["profiler"].stage("step"):
+        session["simulation"].step()
+    return encode_step(session)
+
+
+async def send_message(websocket: WebSocket, message: bytes | dict):
+    if isinstance(message, bytes):
+        await websocket.send_bytes(message)
+    else:
+        await websocket.send_json(message)
+
+
+async def send_frame(websocket: WebSocket, session: dict, frame: bytes | dict):
+    """Send a frame, followed by the session metrics for binary frames if requested."""
+    profiler = session["profiler"]
+    with profiler.stage("send"):
+        await send_message(websocket, frame)
+    profiler.frames_sent += 1
+    if session.get("attach_metrics") and isinstance(frame, bytes):
+        await websocket.send_json(
+            {
+                "type": "metrics",
+                "data": profiler.summary()
+            }
+        )
+
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    """Session metrics in the Prometheus text format."""
+    return Response(metrics.render(sessions, field_cache),
+                    media_type=metrics.CONTENT_TYPE)
+
+
+def stream_options(message: dict) -> dict:
+    """Frame encoding a client asks for with `init`, `restore` or `replay`.
+
+    Raises:
+        ValueError: on an unknown protocol or precision, or a bad keyframe interval.
+    """
+    protocol = message.get("protocol", "json")
+    if protocol not in PROTOCOLS:
+        raise ValueError(f"Unknown protocol: {protocol}")
+    precision = message.get("precision", "int16")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+    delta = (
+        DeltaEncoder(message.get("keyframe_interval", DEFAULT_KEYFRAME_INTERVAL))
+        if message.get("delta") else None
+    )
+    return {"protocol": protocol, "precision": precision, "delta": delta,
+            "attach_metrics": bool(message.get("metrics"))}
+
+
+async def stop_session(session: dict):
+    """Stop the run loop of a session and finish its recording, if any."""
+    await stop_runner(session)
+    sim = session.get("simulation")
+    if getattr(sim, "recorder", None) is not None:
+        sim.recorder.close()
+        sim.recorder = None
+
+
+async def start_session(websocket: WebSocket, session: dict, sim: Simulation | Replay,
+                        options: dict):
+    """Make `sim` the simulation of a session and send the client its initial state."""
+    await stop_session(session)
+    profiler = session["profiler"]
+    profiler.enabled = metrics.SIM_METRICS or options["attach_metrics"]
+    sim.profiler = profiler
+    session["simulation"] = sim
+    session["frame"] = 0
+    session.update(options)
+    await send_state(websocket, session)
+
+
+async def send_state(websocket: WebSocket, session: dict):
+    """Send the whole simulation of a session, as in the reply to `init`."""
+    sim = session["simulation"]
+    state = SimulationState(
+        agents=[SimulationDAO.map_agent_to_dto(agent) 
+                for agent in sim.agents],
+        obstacles=[SimulationDAO.map_obstacle_to_dto(obstacle) 
+                   for obstacle in sim.obstacles],
+        state=sim.state,
+        scenario=sim.scenario.to_dict(),
+        session=session["token"]
+    )
+    await websocket.send_json(
+        {
+            "type": "simulation_state",
+            "data": state.model_dump()
+        }
     )
 
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """Websocket endpoint for the simulation."""
-    await websocket.accept()
+async def websocket_endpoint(websocket: WebSocket,
+                             token: str | None = Query(None, alias="session")):
+    """Websocket endpoint for the simulation.
 
-    client_id = str(uuid.uuid4())
-    active_connections[client_id] = {websocket: websocket}
+    Connect with `?session=<token>` to resume a session after a dropped connection.
+    """
+    await websocket.accept()
+    try:
+        token, session, resumed = await sessions.attach(websocket, token)
+    except AdmissionError as e:
+        await websocket.send_json(
+            {
+                "type": "error",
+                "message": str(e)
+            }
+        )
+        await websocket.close(code=TRY_AGAIN_LATER)
+        return
+    # jobs of a session run one at a time, across its connections too
+    worker = session.setdefault("worker", step_pool.session())
     try:
+        if resumed and session.get("simulation") is not None:
+            await send_state(websocket, session)
         while True:
             message = await websocket.receive_json()
+            sessions.touch(token)
             if message["type"] == "init":
                 config = SimulationConfig(**message["data"])
-                sim = Simulation(config.numAgents, config.numObstacles, config.state)
-                active_connections[client_id]["simulation"] = sim
-
-                state = SimulationState(
-                    agents=[SimulationDAO.map_agent_to_dto(agent) 
-                            for agent in sim.agents],
-                    obstacles=[SimulationDAO.map_obstacle_to_dto(obstacle) 
-                               for obstacle in sim.obstacles],
-                    state=config.state
-                )
+                try:
+                    options = stream_options(message)
+                    scenario = load_scenario(config)
+                    sim = await worker.run(
+                        partial(Simulation, scenario=scenario, integrator=config.integrator,
+                                dt=config.dt, adaptive=config.adaptive),
+                        config.numAgents, config.numObstacles, config.state)
+                    sessions.reserve(token, sim)
+                except (ValueError, AdmissionError) as e:
+                    await websocket.send_json(
+                        {
+                            "type": "error",
+                            "message": str(e)
+                        }
+                    )
+                    continue
+                await start_session(websocket, session, sim, options)
+
+            elif message["type"] in ("restore", "replay"):
+                try:
+                    options = stream_options(message)
+                    name = message.get("name", "")
+                    if message["type"] == "restore":
+                        sim = await worker.run(load_checkpoint, resolve(name, ".npz"))
+                    else:
+                        sim = await worker.run(lambda: Replay(Recording(resolve(name))))
+                    sessions.reserve(token, sim)
+                except (ValueError, OSError, AdmissionError) as e:
+                    await websocket.send_json(
+                        {
+                            "type": "error",
+                            "message": str(e)
+                        }
+                    )
+                    continue
+                await start_session(websocket, session, sim, options)
+
+            elif message["type"] in ("checkpoint", "record", "stop_recording"):
+                sim = session.get("simulation")
+                if not isinstance(sim, Simulation):
+                    await websocket.send_json(
+                        {
+                            "type": "error",
+                            "message": "Simulation not initialized"
+                        }
+                    )
+                    continue
+                name = message.get("name") or f"{metrics.session_label(token)}-{int(time.time())}"
+                try:
+                    if message["type"] == "checkpoint":
+                        path = resolve(name, ".npz")
+                        path.parent.mkdir(parents=True, exist_ok=True)
+                        await worker.run(save_checkpoint, sim, path)
+                    elif message["type"] == "record":
+                        if sim.recorder is not None:
+                            raise ValueError("Already recording")
+                        sim.recorder = await worker.run(
+                            partial(Recorder, resolve(name), sim,
+                                    every=int(message.get("every", DEFAULT_SUBSTEPS))))
+                    else:
+                        recorder, sim.recorder = sim.recorder, None
+                        if recorder is None:
+                            raise ValueError("Not recording")
+                        await worker.run(recorder.close)
+                        name, frames = recorder.path.name, recorder.frames
+                except (TypeError, ValueError, OSError) as e:
+                    await websocket.send_json(
+                        {
+                            "type": "error",
+                            "message": str(e)
+                        }
+                    )
+                    continue
+                data = {"name": name}
+                if message["type"] == "stop_recording":
+                    data["frames"] = frames
                 await websocket.send_json(
                     {
-                        "type": "simulation_state",
-                        "data": state.model_dump()
+                        "type": message["type"],
+                        "data": data
                     }
                 )
 
-            elif message["type"] == "step":
-                sim = active_connections.get(client_id, {}).get("simulation")
-                if sim is not None:
-                    sim.step()
-                    state = SimulationState(
-                        agents=[SimulationDAO.map_agent_to_dto(agent) 
-                                for agent in sim.agents],
-                        obstacles=[SimulationDAO.map_obstacle_to_dto(obstacle) 
-                                   for obstacle in sim.obstacles],
-                        state=sim.state
+            elif message["type"] == "seek":
+                sim = session.get("simulation")
+                if not isinstance(sim, Replay):
+                    await websocket.send_json(
+                        {
+                            "type": "error",
+                            "message": "Not replaying"
+                        }
                     )
+                    continue
+                try:
+                    frame = int(message.get("frame"))
+                except (TypeError, ValueError):
                     await websocket.send_json(
                         {
-                            "type": "simulation_state",
-                            "data": state.model_dump()
+                            "type": "error",
+                            "message": f"Invalid frame: {message.get('frame')!r}"
                         }
                     )
+                    continue
+                # the client jumps; send it the whole crowd
+                if session["delta"] is not None:
+                    session["delta"].force_keyframe = True
+                await send_frame(websocket, session,
+                                 await worker.run(seek_and_encode, session, frame))
+
+            elif message["type"] == "step":
+                sim = session.get("simulation")
+                if sim is not None:
+                    frame = await worker.run(step_and_encode, session)
+                    await send_frame(websocket, session, frame)
                     if not sim.state:
                         await websocket.close()
                 else:
@@ -117,9 +416,82 @@ async def websocket_endpoint(websocket: WebSocket):
                         }
                     )
 
-            elif message["type"] == "get_path":
-                sim = active_connections.get(client_id, {}).get("simulation")
+            elif message["type"] == "run":
+                sim = session.get("simulation")
                 if sim is not None:
+                    await stop_runner(session)
+                    try:
+                        runner = SimulationRunner(
+                            sim,
+                            encode=lambda session=session: encode_step(session),
+                            send=lambda frame, session=session: send_frame(
+                                websocket, session, frame),
+                            substeps=message.get("substeps", DEFAULT_SUBSTEPS),
+                            fps=message.get("fps", DEFAULT_FPS),
+                            worker=worker,
+                            profiler=session["profiler"],
+                            on_drop=lambda session=session: resync_after_drop(session),
+                        )
+                    except ValueError as e:
+                        await websocket.send_json(
+                            {
+                                "type": "error",
+                                "message": str(e)
+                            }
+                        )
+                        continue
+                    session["runner"] = runner
+                    runner.start()
+                else:
+                    await websocket.send_json(
+                        {
+                            "type": "error",
+                            "message": "Simulation not initialized"
+                        }
+                    )
+
+            elif message["type"] in ("pause", "resume", "set_rate"):
+                runner = session.get("runner")
+                if runner is None:
+                    await websocket.send_json(
+                        {
+                            "type": "error",
+                            "message": "Simulation not running"
+                        }
+                    )
+                elif message["type"] == "pause":
+                    runner.pause()
+                elif message["type"] == "resume":
+                    runner.resume()
+                else:
+                    try:
+                        runner.set_rate(message.get("substeps"), message.get("fps"))
+                    except ValueError as e:
+                        await websocket.send_json(
+                            {
+                                "type": "error",
+                                "message": str(e)
+                            }
+                        )
+
+            elif message["type"] == "keyframe":
+                delta = session.get("delta")
+                if delta is not None:
+                    delta.force_keyframe = True
+
+            elif message["type"] == "get_path":
+                sim = session.get("simulation")
+                fmt = message.get("format", "hex")
+                if fmt not in PATH_IMAGE_FORMATS:
+                    await websocket.send_json(
+                        {
+                            "type": "error",
+                            "message": f"Unknown path image format: {fmt}"
+                        }
+                    )
+                elif sim is not None and fmt != "hex":
+                    await websocket.send_bytes(encode_path_image(sim, fmt))
+                elif sim is not None:
                     await websocket.send_json(
                         {
                             "type": "path_image",
@@ -134,10 +506,13 @@ async def websocket_endpoint(websocket: WebSocket):
                         }
                     )
 
-    except Exception as e:
-        print(e)
+    except WebSocketDisconnect:
+        pass
+    except Exception:
+        logger.exception("websocket session %s failed", metrics.session_label(token))
     finally:
-        del active_connections[client_id]
+        # keep the session for the client to resume; it is evicted when idle
+        await sessions.detach(token, websocket)
 
 
 if __name__ == "__main__":
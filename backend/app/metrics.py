@@ -0,0 +1,110 @@
+"""Prometheus text exposition of the live sessions."""
+import hashlib
+import os
+from typing import TYPE_CHECKING
+
+from app.models.field_cache import FieldCache
+from app.models.profiling import BUCKETS
+
+if TYPE_CHECKING:
+    from app.sessions import SessionManager
+
+# profile every session; otherwise only sessions that ask for metrics are profiled
+SIM_METRICS = os.environ.get("SIM_METRICS", "").lower() in ("1", "true", "yes")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def session_label(token: str) -> str:
+    return hashlib.blake2b(token.encode(), digest_size=6).hexdigest()
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def render(manager: "SessionManager", field_cache: FieldCache | None = None) -> str:
+    """Render the metrics of all sessions in the Prometheus text format.
+
+    Args:
+        manager (SessionManager): the sessions of the server.
+        field_cache (FieldCache | None): cache whose statistics to include.
+
+    Returns:
+        str: the exposition, one sample per line.
+    """
+    # call on the event loop, which owns `sessions`; stage histograms are still
+    # added from worker threads, so those are iterated over a snapshot
+    sessions = manager.sessions
+    connected = sum(session.get("websocket") is not None for session in sessions.values())
+    lines = [
+        "# HELP sim_active_connections Open /ws connections.",
+        "# TYPE sim_active_connections gauge",
+        f"sim_active_connections {connected}",
+        "# HELP sim_sessions Sessions kept, by whether a client is connected.",
+        "# TYPE sim_sessions gauge",
+        f"sim_sessions{_labels(state='connected')} {connected}",
+        f"sim_sessions{_labels(state='detached')} {len(sessions) - connected}",
+        f"sim_sessions{_labels(state='spilled')} {len(manager.spilled)}",
+        "# HELP sim_session_bytes Memory held by the simulations of all sessions.",
+        "# TYPE sim_session_bytes gauge",
+        f"sim_session_bytes {manager.nbytes()}",
+        "# HELP sim_session_evictions_total Sessions evicted to make room or when idle.",
+        "# TYPE sim_session_evictions_total counter",
+        f"sim_session_evictions_total {manager.evictions}",
+        "# HELP sim_session_rejections_total Sessions or simulations refused at the limits.",
+        "# TYPE sim_session_rejections_total counter",
+        f"sim_session_rejections_total {manager.rejections}",
+        "# HELP sim_agents Agents per session.",
+        "# TYPE sim_agents gauge",
+    ]
+    # sessions are labelled by a digest, so that scraping does not leak their tokens
+    sessions = {session_label(token): session for token, session in sessions.items()}
+    for client_id, session in sessions.items():
+        sim = session.get("simulation")
+        if sim is not None:
+            active = sim.active.size
+            lines.append(f"sim_agents{_labels(session=client_id, state='active')} {active}")
+            lines.append(f"sim_agents{_labels(session=client_id, state='exited')} "
+                         f"{len(sim.agent_state) - active}")
+
+    profilers = {client_id: session["profiler"] for client_id, session in sessions.items()
+                 if "profiler" in session}
+    for name, help_text in (("frames_sent", "Frames sent to the client."),
+                            ("frames_dropped", "Frames coalesced behind a slow socket.")):
+        lines.append(f"# HELP sim_{name}_total {help_text}")
+        lines.append(f"# TYPE sim_{name}_total counter")
+        for client_id, profiler in profilers.items():
+            lines.append(f"sim_{name}_total{_labels(session=client_id)} "
+                         f"{getattr(profiler, name)}")
+
+    lines.append("# HELP sim_stage_seconds Time spent per stage of a step or frame.")
+    lines.append("# TYPE sim_stage_seconds histogram")
+    for client_id, profiler in profilers.items():
+        for stage, histogram in list(profiler.stages.items()):
+            cumulative = histogram.buckets.cumsum()
+            for bound, count in zip(BUCKETS, cumulative):
+                lines.append("sim_stage_seconds_bucket"
+                             f"{_labels(session=client_id, stage=stage, le=bound)} {count}")
+            lines.append("sim_stage_seconds_bucket"
+                         f"{_labels(session=client_id, stage=stage, le='+Inf')} "
+                         f"{histogram.count}")
+            lines.append(f"sim_stage_seconds_sum{_labels(session=client_id, stage=stage)} "
+                         f"{histogram.sum}")
+            lines.append(f"sim_stage_seconds_count{_labels(session=client_id, stage=stage)} "
+                         f"{histogram.count}")
+
+    if field_cache is not None:
+        stats = field_cache.stats()
+        lines += [
+            "# HELP sim_field_cache_hits_total Field cache hits.",
+            "# TYPE sim_field_cache_hits_total counter",
+            f"sim_field_cache_hits_total {stats['hits']}",
+            "# HELP sim_field_cache_misses_total Field cache misses.",
+            "# TYPE sim_field_cache_misses_total counter",
+            f"sim_field_cache_misses_total {stats['misses']}",
+            "# HELP sim_field_cache_bytes Bytes held by the field cache.",
+            "# TYPE sim_field_cache_bytes gauge",
+            f"sim_field_cache_bytes {stats['bytes']}",
+        ]
+    return "\n".join(lines) + "\n"
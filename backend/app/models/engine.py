@@ -0,0 +1,230 @@
+"""Batched NumPy force and integration kernels operating on `AgentState` arrays."""
+import numpy as np
+
+PAIR_CHUNK = 1024  # rows of the pairwise distance matrix evaluated at once
+
+# "euler" moves with the old velocity before applying the force, as the original
+# model did; "semi_implicit" applies the force first; "verlet" is velocity Verlet
+# in its one-evaluation (leapfrog) form, where velocities live at half steps
+INTEGRATORS = ("euler", "semi_implicit", "verlet")
+# fraction of the stability and displacement limits a step may use
+COURANT = 0.5
+
+
+def desired_force(v_t: np.ndarray, v_des: np.ndarray, m: np.ndarray, tau: np.ndarray,
+                  grid_position: np.ndarray, path_dir_grid: np.ndarray) -> np.ndarray:
+    """Calculate the driving force towards the exit for a batch of agents.
+
+    Args:
+        v_t (np.ndarray): current velocities. shape: (n, 2)
+        v_des (np.ndarray): desired speeds. shape: (n, 2)
+        m (np.ndarray): masses. shape: (n,)
+        tau (np.ndarray): relaxation times. shape: (n,)
+        grid_position (np.ndarray): positions on grid. shape: (n, 2)
+        path_dir_grid (np.ndarray): direction field. shape: (2, rows, cols)
+
+    Returns:
+        np.ndarray: driving force. shape: (n, 2)
+    """
+    i, j = grid_position[:, 0], grid_position[:, 1]
+    e = path_dir_grid[:, i, j].T  # shape: (n, 2)
+    return (v_des * e - v_t) * (m / tau)[:, np.newaxis]
+
+
+def wall_force(grid_position: np.ndarray, r: np.ndarray,
+               wall_distance_grid: np.ndarray,
+               wall_direction_grid: np.ndarray,
+               obstacle_distance_grid: np.ndarray,
+               obstacle_direction_grid: np.ndarray,
+               a: float, b: float) -> np.ndarray:
+    """Calculate the force exerted by walls and obstacles on a batch of agents.
+
+    Args:
+        grid_position (np.ndarray): positions on grid. shape: (n, 2)
+        r (np.ndarray): agent radii. shape: (n,)
+        wall_distance_grid (np.ndarray): shape: (4, rows, cols)
+        wall_direction_grid (np.ndarray): shape: (4, 2, rows, cols)
+        obstacle_distance_grid (np.ndarray): shape: (k, rows, cols)
+        obstacle_direction_grid (np.ndarray): shape: (k, 2, rows, cols)
+        a (float): repulsion strength.
+        b (float): repulsion range (negative).
+
+    Returns:
+        np.ndarray: force exerted by walls and obstacles. shape: (n, 2)
+    """
+    i, j = grid_position[:, 0], grid_position[:, 1]
+    f = np.zeros((grid_position.shape[0], 2))
+    for distance, direction in ((wall_distance_grid, wall_direction_grid),
+                                (obstacle_distance_grid, obstacle_direction_grid)):
+        if distance.shape[0] == 0:
+            continue
+        magnitude = a * np.exp((distance[:, i, j] - r) / b)  # shape: (k, n)
+        # shape: (k, 2, n) -> (n, 2)
+        f += (magnitude[:, np.newaxis, :] * direction[:, :, i, j]).sum(axis=0).T
+    return f
+
+
+def pair_force(position: np.ndarray, r: np.ndarray, targets: np.ndarray,
+               a: float, b: float) -> np.ndarray:
+    """Calculate the summed agent-agent repulsion on `targets` from every agent.
+
+    The distance matrix is evaluated in chunks of `PAIR_CHUNK` rows to bound
+    memory use for large crowds.
+
+    Args:
+        position (np.ndarray): positions of every agent. shape: (N, 2)
+        r (np.ndarray): radii of every agent. shape: (N,)
+        targets (np.ndarray): indices of the agents to compute the force on. shape: (n,)
+        a (float): repulsion strength.
+        b (float): repulsion range (negative).
+
+    Returns:
+        np.ndarray: summed repulsion on each target. shape: (n, 2)
+    """
+    f = np.zeros((targets.shape[0], 2))
+    for start in range(0, targets.shape[0], PAIR_CHUNK):
+        rows = targets[start:start + PAIR_CHUNK]
+        diff = position[rows, np.newaxis, :] - position[np.newaxis, :, :]  # (c, N, 2)
+        d = np.sqrt((diff ** 2).sum(axis=-1))
+        d = np.maximum(d, 1)
+        magnitude = a * np.exp((d - (r[rows, np.newaxis] + r[np.newaxis, :])) / b) / d
+        f[start:start + PAIR_CHUNK] = (magnitude[:, :, np.newaxis] * diff).sum(axis=1)
+    return f
+
+
+def neighbor_force(position: np.ndarray, r: np.ndarray, i: np.ndarray, j: np.ndarray,
+                   a: float, b: float) -> np.ndarray:
+    """Calculate the summed agent-agent repulsion over a list of interacting pairs.
+
+    Args:
+        position (np.ndarray): positions of every agent. shape: (N, 2)
+        r (np.ndarray): radii of every agent. shape: (N,)
+        i (np.ndarray): index of the agent the force acts on, per pair. shape: (p,)
+        j (np.ndarray): index of the neighbor exerting it, per pair. shape: (p,)
+        a (float): repulsion strength.
+        b (float): repulsion range (negative).
+
+    Returns:
+        np.ndarray: summed repulsion on every agent. shape: (N, 2)
+    """
+    diff = position[i] - position[j]
+    d = np.maximum(np.sqrt((diff ** 2).sum(axis=1)), 1)
+    magnitude = a * np.exp((d - (r[i] + r[j])) / b) / d
+    n = position.shape[0]
+    return np.stack([np.bincount(i, weights=magnitude * diff[:, 0], minlength=n),
+                     np.bincount(i, weights=magnitude * diff[:, 1], minlength=n)], axis=1)
+
+
+def integrate(position: np.ndarray, v_t: np.ndarray, f: np.ndarray, m: np.ndarray,
+              grid_shape: tuple[int, int], grid_size: float, dt: float,
+              method: str = "euler", last_dt: np.ndarray | None = None
+              ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Advance a batch of agents by one step of `method`, see `INTEGRATORS`.
+
+    Agents leaving the grid are snapped to the centre of the nearest boundary cell.
+
+    Args:
+        position (np.ndarray): positions. shape: (n, 2)
+        v_t (np.ndarray): velocities. shape: (n, 2)
+        f (np.ndarray): total force. shape: (n, 2)
+        m (np.ndarray): masses. shape: (n,)
+        grid_shape (tuple[int, int]): (rows, cols) of the grid.
+        grid_size (float): size of a grid cell.
+        dt (float): time step [second].
+        method (str): integrator, one of `INTEGRATORS`.
+        last_dt (np.ndarray | None): previous step of each agent, 0 before the
+            first; required by "verlet", whose kick spans half of each. shape: (n,)
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: new positions, new grid
+            positions and new velocities.
+    """
+    a = f / m[:, np.newaxis]
+    if method == "euler":
+        new_pos = position + v_t * dt
+        new_v_t = v_t + a * dt
+    elif method == "semi_implicit":
+        new_v_t = v_t + a * dt
+        new_pos = position + new_v_t * dt
+    elif method == "verlet":
+        new_v_t = v_t + a * (0.5 * (last_dt + dt))[:, np.newaxis]
+        new_pos = position + new_v_t * dt
+    else:
+        raise ValueError(f"Unknown integrator: {method}")
+
+    new_grid_pos = np.floor_divide(new_pos, grid_size)
+    upper = np.array(grid_shape) - 1
+    oob = ((new_grid_pos < 0) | (new_grid_pos > upper)).any(axis=1)
+    if oob.any():
+        # snap to the nearest boundary
+        new_grid_pos[oob] = np.clip(new_grid_pos[oob], 0, upper)
+        new_pos[oob] = (new_grid_pos[oob] + 0.5) * grid_size
+    return new_pos, new_grid_pos.astype(np.int32), new_v_t
+
+
+def clearance(position: np.ndarray, r: np.ndarray, i: np.ndarray, j: np.ndarray,
+              grid_position: np.ndarray, wall_distance_grid: np.ndarray,
+              obstacle_distance_grid: np.ndarray) -> np.ndarray:
+    """Gap between every agent and the nearest agent, wall or obstacle surface.
+
+    Args:
+        position (np.ndarray): positions. shape: (n, 2)
+        r (np.ndarray): agent radii. shape: (n,)
+        i (np.ndarray): target indices of the neighbor pairs. shape: (p,)
+        j (np.ndarray): neighbor indices of the neighbor pairs. shape: (p,)
+        grid_position (np.ndarray): positions on grid. shape: (n, 2)
+        wall_distance_grid (np.ndarray): shape: (4, rows, cols)
+        obstacle_distance_grid (np.ndarray): shape: (k, rows, cols)
+
+    Returns:
+        np.ndarray: gaps, negative when overlapping; inf with nothing in range.
+            shape: (n,)
+    """
+    gi, gj = grid_position[:, 0], grid_position[:, 1]
+    gap = wall_distance_grid[:, gi, gj].min(axis=0) - r
+    if obstacle_distance_grid.shape[0]:
+        gap = np.minimum(gap, obstacle_distance_grid[:, gi, gj].min(axis=0) - r)
+    if i.size:
+        d = np.sqrt(((position[i] - position[j]) ** 2).sum(axis=1))
+        np.minimum.at(gap, i, d - r[i] - r[j])
+    return gap
+
+
+def stable_dt(v_t: np.ndarray, v_des: np.ndarray, m: np.ndarray, tau: np.ndarray,
+              gap: np.ndarray, a: float, b: float, grid_size: float,
+              courant: float = COURANT) -> np.ndarray:
+    """Largest step each agent can take without losing stability or accuracy.
+
+    Three limits apply, each scaled by `courant`:
+
+    - relaxation: explicit steps of the driving force are stable below 2 tau;
+    - repulsion: the stiffest spring acting on an agent is a / |b| exp(gap / b)
+      from its nearest surface, stable below 2 / omega with omega² = k / m;
+    - displacement: an agent may cover its gap to that surface, but at least the
+      repulsion range |b| and at most one grid cell, at the faster of its current
+      and desired speed.
+
+    Crowded agents are therefore limited by their neighbors, free ones by the grid.
+
+    Args:
+        v_t (np.ndarray): velocities. shape: (n, 2)
+        v_des (np.ndarray): desired speeds. shape: (n, 2)
+        m (np.ndarray): masses. shape: (n,)
+        tau (np.ndarray): relaxation times. shape: (n,)
+        gap (np.ndarray): clearance of each agent, see `clearance`. shape: (n,)
+        a (float): repulsion strength.
+        b (float): repulsion range (negative).
+        grid_size (float): size of a grid cell.
+        courant (float): safety factor.
+
+    Returns:
+        np.ndarray: step limit of each agent [second]. shape: (n,)
+    """
+    stiffness = a / abs(b) * np.exp(gap / b)
+    with np.errstate(divide="ignore"):
+        dt_force = 2 / np.sqrt(stiffness / m)
+    speed = np.maximum(np.linalg.norm(v_t, axis=1), np.linalg.norm(v_des, axis=1))
+    reach = np.clip(gap, abs(b), grid_size)
+    with np.errstate(divide="ignore"):
+        dt_move = reach / speed
+    return courant * np.minimum(np.minimum(dt_force, 2 * tau), dt_move)
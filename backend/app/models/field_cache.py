@@ -0,0 +1,100 @@
+"""Content-addressed cache of the static per-cell fields of a map layout."""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+
+import numpy as np
+
+from .utils import obstacle_rects
+
+# memory budget of the shared cache [bytes]
+SIM_FIELD_CACHE_BYTES = int(os.environ.get("SIM_FIELD_CACHE_BYTES", 256 * 2**20))
+
+
+class FieldCache:
+    """LRU cache of precomputed fields, keyed by a hash of the layout.
+
+    Cached arrays are made read-only and handed out without copying, so every
+    simulation on the same layout shares one set of fields. Entries are evicted
+    least recently used first once their total size exceeds `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = SIM_FIELD_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, dict[str, np.ndarray]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(grid: np.ndarray, obstacles: list, *params) -> str:
+        """Hash of the grid, the obstacle rectangles and any other build parameters."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(str((grid.shape, grid.dtype.str, params)).encode())
+        h.update(np.ascontiguousarray(grid).tobytes())
+        h.update(obstacle_rects(obstacles).tobytes())
+        return h.hexdigest()
+
+    def get_or_build(self, key: str,
+                     build: Callable[[], dict[str, np.ndarray]]) -> dict[str, np.ndarray]:
+        """Return the fields stored under `key`, building and storing them on a miss.
+
+        Args:
+            key (str): layout key, see `FieldCache.key`.
+            build (Callable[[], dict[str, np.ndarray]]): computes the fields.
+
+        Returns:
+            dict[str, np.ndarray]: read-only fields by name.
+        """
+        with self._lock:
+            fields = self._entries.get(key)
+            if fields is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return fields
+            self.misses += 1
+
+        # built outside the lock; a concurrent miss on the same key builds twice
+        fields = build()
+        for array in fields.values():
+            array.setflags(write=False)
+        size = sum(_nbytes(array) for array in fields.values())
+        with self._lock:
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = fields
+                self.nbytes += size
+                self._evict()
+            return self._entries.get(key, fields)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self.nbytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._entries:
+            _, fields = self._entries.popitem(last=False)
+            self.nbytes -= sum(_nbytes(array) for array in fields.values())
+
+
+def _nbytes(array: np.ndarray) -> int:
+    """Memory actually held by an array; broadcast axes take none."""
+    return array.itemsize * int(np.prod([n for n, stride in zip(array.shape, array.strides)
+                                         if stride]))
+
+
+field_cache = FieldCache()
@@ -0,0 +1,202 @@
+"""Numba-compiled kernels for the simulation step and field precomputation.
+
+Numba is optional: when it cannot be imported `HAS_NUMBA` is False, no kernels
+are defined and `Simulation` falls back to the NumPy engine.
+"""
+import math
+import os
+
+import numpy as np
+
+try:
+    from numba import config, njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+if HAS_NUMBA and "NUMBA_THREADING_LAYER_PRIORITY" not in os.environ:
+    # kernels are first launched from the worker threads of the server; a TBB pool
+    # started off the main thread keeps the interpreter from exiting
+    config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+
+
+if HAS_NUMBA:
+
+    @njit(parallel=True, fastmath=True, cache=True, nogil=True)
+    def step(position, v_t, grid_position, exited, last_dt,
+             v_des, m, tau, r, active, targets,
+             order, cell_start, cell_count, cells, cell_shape, cutoff,
+             grid, path_dir_grid,
+             wall_distance_grid, wall_direction_grid,
+             obstacle_distance_grid, obstacle_direction_grid,
+             a, b, grid_size, dt, method):
+        """Advance the target agents by one step, updating the state arrays in place.
+
+        Mirrors `Simulation.step` on the NumPy engine: forces are evaluated for all
+        targets from the same snapshot before any agent is moved. The cell list is
+        built over the active agents only, so its `order` and `cells`, like
+        `targets`, are indexed by position within `active`. `method` is the index
+        of the integrator in `engine.INTEGRATORS`.
+        """
+        n = targets.shape[0]
+        f = np.zeros((n, 2))
+        cutoff2 = cutoff * cutoff
+        rows, cols = grid.shape
+        for k in prange(n):
+            l = targets[k]
+            t = active[l]
+            gi, gj = grid_position[t, 0], grid_position[t, 1]
+            # desired velocity
+            for c in range(2):
+                f[k, c] = (v_des[t, c] * path_dir_grid[c, gi, gj] - v_t[t, c]) * m[t] / tau[t]
+            # walls and obstacles
+            for w in range(wall_distance_grid.shape[0]):
+                mag = a * math.exp((wall_distance_grid[w, gi, gj] - r[t]) / b)
+                f[k, 0] += mag * wall_direction_grid[w, 0, gi, gj]
+                f[k, 1] += mag * wall_direction_grid[w, 1, gi, gj]
+            for w in range(obstacle_distance_grid.shape[0]):
+                mag = a * math.exp((obstacle_distance_grid[w, gi, gj] - r[t]) / b)
+                f[k, 0] += mag * obstacle_direction_grid[w, 0, gi, gj]
+                f[k, 1] += mag * obstacle_direction_grid[w, 1, gi, gj]
+            # neighbors from the surrounding cells
+            for dr in range(-1, 2):
+                cr = cells[l, 0] + dr
+                if cr < 0 or cr >= cell_shape[0]:
+                    continue
+                for dc in range(-1, 2):
+                    cc = cells[l, 1] + dc
+                    if cc < 0 or cc >= cell_shape[1]:
+                        continue
+                    key = cr * cell_shape[1] + cc
+                    for s in range(cell_start[key], cell_start[key] + cell_count[key]):
+                        if order[s] == l:
+                            continue
+                        j = active[order[s]]
+                        # agents that left during an earlier substep no longer repel
+                        if exited[j]:
+                            continue
+                        dy = position[t, 0] - position[j, 0]
+                        dx = position[t, 1] - position[j, 1]
+                        d2 = dy * dy + dx * dx
+                        if d2 >= cutoff2:
+                            continue
+                        d = max(math.sqrt(d2), 1.0)
+                        mag = a * math.exp((d - (r[t] + r[j])) / b) / d
+                        f[k, 0] += mag * dy
+                        f[k, 1] += mag * dx
+
+        for k in prange(n):
+            t = active[targets[k]]
+            if method == 0:
+                # explicit Euler: move with the old velocity
+                p0 = position[t, 0] + v_t[t, 0] * dt
+                p1 = position[t, 1] + v_t[t, 1] * dt
+                v_t[t, 0] += f[k, 0] / m[t] * dt
+                v_t[t, 1] += f[k, 1] / m[t] * dt
+            else:
+                kick = dt if method == 1 else 0.5 * (last_dt[t] + dt)
+                v_t[t, 0] += f[k, 0] / m[t] * kick
+                v_t[t, 1] += f[k, 1] / m[t] * kick
+                p0 = position[t, 0] + v_t[t, 0] * dt
+                p1 = position[t, 1] + v_t[t, 1] * dt
+            last_dt[t] = dt
+            g0 = math.floor(p0 / grid_size)
+            g1 = math.floor(p1 / grid_size)
+            if g0 < 0 or g0 >= rows or g1 < 0 or g1 >= cols:
+                # snap to the nearest boundary
+                g0 = min(max(g0, 0), rows - 1)
+                g1 = min(max(g1, 0), cols - 1)
+                p0 = (g0 + 0.5) * grid_size
+                p1 = (g1 + 0.5) * grid_size
+            position[t, 0] = p0
+            position[t, 1] = p1
+            grid_position[t, 0] = g0
+            grid_position[t, 1] = g1
+            exited[t] = grid[g0, g1] == 1
+
+    @njit(parallel=True, fastmath=True, cache=True, nogil=True)
+    def clearance(position, grid_position, r, active,
+                  order, cell_start, cell_count, cells, cell_shape, cutoff,
+                  wall_distance_grid, obstacle_distance_grid):
+        """Compiled counterpart of `engine.clearance` over the cell list.
+
+        Returns:
+            np.ndarray: gap of each active agent to its nearest surface.
+        """
+        n = active.shape[0]
+        gap = np.empty(n)
+        cutoff2 = cutoff * cutoff
+        for k in prange(n):
+            t = active[k]
+            gi, gj = grid_position[t, 0], grid_position[t, 1]
+            g = np.inf
+            for w in range(wall_distance_grid.shape[0]):
+                g = min(g, wall_distance_grid[w, gi, gj] - r[t])
+            for w in range(obstacle_distance_grid.shape[0]):
+                g = min(g, obstacle_distance_grid[w, gi, gj] - r[t])
+            for dr in range(-1, 2):
+                cr = cells[k, 0] + dr
+                if cr < 0 or cr >= cell_shape[0]:
+                    continue
+                for dc in range(-1, 2):
+                    cc = cells[k, 1] + dc
+                    if cc < 0 or cc >= cell_shape[1]:
+                        continue
+                    key = cr * cell_shape[1] + cc
+                    for s in range(cell_start[key], cell_start[key] + cell_count[key]):
+                        if order[s] == k:
+                            continue
+                        j = active[order[s]]
+                        dy = position[t, 0] - position[j, 0]
+                        dx = position[t, 1] - position[j, 1]
+                        d2 = dy * dy + dx * dx
+                        if d2 < cutoff2:
+                            g = min(g, math.sqrt(d2) - r[t] - r[j])
+            gap[k] = g
+        return gap
+
+    @njit(parallel=True, fastmath=True, cache=True, nogil=True)
+    def obstacle_distance_grid(rects, rows, cols, grid_size, nearest):
+        """Compiled counterpart of `utils.obstacle_distance_grid`.
+
+        Args:
+            rects (np.ndarray): obstacle rectangles as (row0, col0, row1, col1) on
+                canvas. shape: (n, 4)
+            rows (int): number of grid rows.
+            cols (int): number of grid columns.
+            grid_size (float): size of a grid cell.
+            nearest (int): obstacles kept per cell; at most n.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: float32 distance grid of shape
+                (nearest, rows, cols) and direction grid of shape
+                (nearest, 2, rows, cols).
+        """
+        n = rects.shape[0]
+        k = nearest
+        distance_grid = np.full((k, rows, cols), np.inf, dtype=np.float32)
+        direction_grid = np.zeros((k, 2, rows, cols), dtype=np.float32)
+        for i in prange(rows):
+            y = (i + 0.5) * grid_size
+            for j in range(cols):
+                x = (j + 0.5) * grid_size
+                for o in range(n):
+                    dy = y - min(max(y, rects[o, 0]), rects[o, 2])
+                    dx = x - min(max(x, rects[o, 1]), rects[o, 3])
+                    d = math.sqrt(dy * dy + dx * dx)
+                    if d <= 3:
+                        d = 5
+                    # the first k obstacles fill the slabs in order, later ones
+                    # replace the farthest kept one when closer
+                    slot = o
+                    if o >= k:
+                        slot = 0
+                        for s in range(1, k):
+                            if distance_grid[s, i, j] > distance_grid[slot, i, j]:
+                                slot = s
+                        if d >= distance_grid[slot, i, j]:
+                            continue
+                    distance_grid[slot, i, j] = d
+                    direction_grid[slot, 0, i, j] = dy / d
+                    direction_grid[slot, 1, i, j] = dx / d
+        return distance_grid, direction_grid
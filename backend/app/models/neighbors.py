@@ -0,0 +1,111 @@
+"""Cell-list neighbor search for agent-agent interactions."""
+import math
+
+import numpy as np
+
+
+def interaction_cutoff(r: float, a: float, b: float, tol: float = 1e-3) -> float:
+    """Distance beyond which the repulsion between two agents drops below `tol`.
+
+    Solves `a * exp((d - 2r) / b) = tol` for d; `b` is negative.
+
+    Args:
+        r (float): agent radius.
+        a (float): repulsion strength.
+        b (float): repulsion range (negative).
+        tol (float): force magnitude considered negligible.
+
+    Returns:
+        float: interaction cutoff distance.
+    """
+    return 2 * r + b * math.log(tol / a)
+
+
+class CellList:
+    """Buckets agents into square cells at least `cutoff` wide.
+
+    All agents within `cutoff` of an agent are then found in the 3x3 block of
+    cells around it, so candidate pairs grow with N instead of N².
+
+    Cells are aligned with the simulation grid: each cell spans a whole number
+    of `grid_size` cells.
+    """
+
+    def __init__(self, cutoff: float, extent: tuple[float, float], grid_size: float):
+        """Initialize an empty cell list.
+
+        Args:
+            cutoff (float): interaction cutoff distance.
+            extent (tuple[float, float]): (height, width) of the world on canvas.
+            grid_size (float): size of a simulation grid cell.
+        """
+        self.cutoff = cutoff
+        self.cell_size = math.ceil(cutoff / grid_size) * grid_size
+        self.shape = (max(1, math.ceil(extent[0] / self.cell_size)),
+                      max(1, math.ceil(extent[1] / self.cell_size)))
+        self.order = np.zeros(0, dtype=np.intp)
+        self.cell_start = np.zeros(self.shape[0] * self.shape[1], dtype=np.intp)
+        self.cell_count = np.zeros(self.shape[0] * self.shape[1], dtype=np.intp)
+        self.cells = np.zeros((0, 2), dtype=np.intp)
+
+    def cell_of(self, position: np.ndarray) -> np.ndarray:
+        """Cell (row, col) of each position, clipped to the cell grid."""
+        cells = np.floor_divide(position, self.cell_size).astype(np.intp)
+        return np.clip(cells, 0, np.array(self.shape) - 1)
+
+    def build(self, position: np.ndarray):
+        """Rebuild the buckets from the current positions with a counting sort.
+
+        Args:
+            position (np.ndarray): positions of every agent. shape: (N, 2)
+        """
+        self.cells = self.cell_of(position)
+        keys = self.cells[:, 0] * self.shape[1] + self.cells[:, 1]
+        self.order = np.argsort(keys, kind="stable")
+        self.cell_count = np.bincount(keys, minlength=self.shape[0] * self.shape[1])
+        self.cell_start = np.cumsum(self.cell_count) - self.cell_count
+
+    def candidates(self, targets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """All (target, other) pairs whose cells are adjacent.
+
+        Args:
+            targets (np.ndarray): agent indices to find neighbors for. shape: (n,)
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: target and neighbor indices, including
+                pairs beyond the cutoff and each target paired with itself.
+        """
+        i_parts, j_parts = [], []
+        cells = self.cells[targets]
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                row, col = cells[:, 0] + dr, cells[:, 1] + dc
+                valid = (row >= 0) & (row < self.shape[0]) & (col >= 0) & (col < self.shape[1])
+                keys = row[valid] * self.shape[1] + col[valid]
+                count = self.cell_count[keys]
+                total = count.sum()
+                if total == 0:
+                    continue
+                # expand each cell's [start, start + count) range into one index array
+                offsets = np.repeat(self.cell_start[keys] - (np.cumsum(count) - count), count)
+                i_parts.append(np.repeat(targets[valid], count))
+                j_parts.append(self.order[np.arange(total) + offsets])
+        if not i_parts:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        return np.concatenate(i_parts), np.concatenate(j_parts)
+
+    def pairs(self, position: np.ndarray,
+              targets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """All distinct (target, other) pairs closer than the cutoff.
+
+        Args:
+            position (np.ndarray): positions of every agent. shape: (N, 2)
+            targets (np.ndarray): agent indices to find neighbors for. shape: (n,)
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: target and neighbor indices.
+        """
+        i, j = self.candidates(targets)
+        d2 = ((position[i] - position[j]) ** 2).sum(axis=1)
+        keep = (i != j) & (d2 < self.cutoff ** 2)
+        return i[keep], j[keep]
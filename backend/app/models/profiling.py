@@ -0,0 +1,94 @@
+"""Lightweight per-stage timing of the simulation and its sessions."""
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+# upper bounds of the histogram buckets [second]
+BUCKETS = (1e-5, 3e-5, 1e-4, 3e-4, 1e-3, 3e-3, 1e-2, 3e-2, 1e-1, 3e-1, 1.0)
+# number of recent samples the rolling quantiles are computed over
+DEFAULT_WINDOW = 1024
+
+_NULL_STAGE = nullcontext()
+
+
+class Histogram:
+    """Durations of one stage.
+
+    Keeps cumulative bucket counts, as Prometheus expects, and a ring buffer of the
+    last `window` samples for rolling quantiles.
+    """
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.buckets = np.zeros(len(BUCKETS) + 1, dtype=np.int64)
+        self.count = 0
+        self.sum = 0.0
+        self._recent = np.zeros(window)
+
+    def observe(self, seconds: float):
+        self.buckets[np.searchsorted(BUCKETS, seconds)] += 1
+        self._recent[self.count % len(self._recent)] = seconds
+        self.count += 1
+        self.sum += seconds
+
+    def recent(self) -> np.ndarray:
+        """The last (up to `window`) samples, in no particular order."""
+        return self._recent[:min(self.count, len(self._recent))]
+
+    def summary(self) -> dict[str, float]:
+        """Mean, median and 99th percentile of the recent samples [second]."""
+        recent = self.recent()
+        if recent.size == 0:
+            return {"count": 0, "mean": 0.0, "p50": 0.0, "p99": 0.0}
+        p50, p99 = np.percentile(recent, (50, 99))
+        return {"count": self.count, "mean": float(recent.mean()),
+                "p50": float(p50), "p99": float(p99)}
+
+
+class _Stage:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Profiler:
+    """Per-stage timings and frame counters of one session.
+
+    When disabled, `stage` hands out a shared no-op context manager, so the
+    instrumented code paths cost one attribute lookup and an empty `with`.
+    """
+
+    def __init__(self, enabled: bool = True, window: int = DEFAULT_WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self.stages: dict[str, Histogram] = {}
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+    def stage(self, name: str):
+        """Context manager timing one execution of the stage `name`."""
+        if not self.enabled:
+            return _NULL_STAGE
+        histogram = self.stages.get(name)
+        if histogram is None:
+            histogram = self.stages[name] = Histogram(self.window)
+        return _Stage(histogram)
+
+    def summary(self) -> dict:
+        """Rolling timings per stage and the frame counters, for attaching to frames."""
+        return {
+            "stages": {name: h.summary() for name, h in self.stages.items()},
+            "frames_sent": self.frames_sent,
+            "frames_dropped": self.frames_dropped,
+        }
+
+
+# default of simulations that are not profiled
+NULL_PROFILER = Profiler(enabled=False)
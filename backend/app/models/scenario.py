@@ -0,0 +1,120 @@
+"""Scenario worlds: dimensions, cell size, exits and obstacle layouts."""
+import json
+import os
+import re
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from .utils import EXIT, GRID_SIZE
+
+# the default world, 50 x 40 cells of 10 x 10 on a 500 x 400 canvas
+WIDTH = 500
+HEIGHT = 400
+
+# directory `Scenario.named` loads scenario files from
+SIM_SCENARIO_DIR = Path(os.environ.get("SIM_SCENARIO_DIR",
+                                       Path(__file__).resolve().parents[2] / "scenarios"))
+
+Rect = tuple[int, int, int, int]
+
+
+@dataclass
+class Scenario:
+    """Geometry of a simulated world.
+
+    Rectangles are given as (x, y, width, height) on canvas, like the obstacles sent
+    to the client, and must be aligned to the grid.
+
+    Attributes:
+        width (int): canvas width; a multiple of `grid_size`.
+        height (int): canvas height; a multiple of `grid_size`.
+        grid_size (int): size of a grid cell on canvas.
+        exits (list[Rect]): exit areas.
+        obstacles (list[Rect] | None): obstacle layout; None places random obstacles.
+        nearest_obstacles (int | None): obstacles kept per cell in the obstacle force
+            fields; None keeps one field per obstacle.
+    """
+
+    width: int = WIDTH
+    height: int = HEIGHT
+    grid_size: int = GRID_SIZE
+    exits: list[Rect] = field(default_factory=lambda: [(WIDTH - GRID_SIZE, 140,
+                                                        GRID_SIZE, 110)])
+    obstacles: list[Rect] | None = None
+    nearest_obstacles: int | None = 4
+
+    def __post_init__(self):
+        self.exits = [tuple(int(v) for v in rect) for rect in self.exits]
+        if self.obstacles is not None:
+            self.obstacles = [tuple(int(v) for v in rect) for rect in self.obstacles]
+        if self.grid_size <= 0:
+            raise ValueError(f"grid_size must be positive, got {self.grid_size}")
+        if self.width % self.grid_size or self.height % self.grid_size or \
+                self.width <= 0 or self.height <= 0:
+            raise ValueError(f"World of {self.width} x {self.height} is not a whole "
+                             f"number of {self.grid_size} cells")
+        if not self.exits:
+            raise ValueError("A scenario needs at least one exit")
+        if self.nearest_obstacles is not None and self.nearest_obstacles < 1:
+            raise ValueError(f"nearest_obstacles must be positive, got "
+                             f"{self.nearest_obstacles}")
+        for rect in self.exits + (self.obstacles or []):
+            self.cells(rect)
+
+    @property
+    def rows(self) -> int:
+        return self.height // self.grid_size
+
+    @property
+    def cols(self) -> int:
+        return self.width // self.grid_size
+
+    def cells(self, rect: Rect) -> tuple[slice, slice]:
+        """Grid (rows, cols) slices covered by a rectangle on canvas."""
+        x, y, w, h = rect
+        if any(v % self.grid_size for v in rect):
+            raise ValueError(f"Rectangle {rect} is not aligned to the grid")
+        if w <= 0 or h <= 0 or x < 0 or y < 0 or x + w > self.width or y + h > self.height:
+            raise ValueError(f"Rectangle {rect} is empty or outside the world")
+        gs = self.grid_size
+        return slice(y // gs, (y + h) // gs), slice(x // gs, (x + w) // gs)
+
+    def grid(self) -> np.ndarray:
+        """Empty grid of the world with its exits marked."""
+        grid = np.zeros((self.rows, self.cols), dtype=np.int8)
+        for rect in self.exits:
+            grid[self.cells(rect)] = EXIT
+        return grid
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Scenario":
+        """Create a scenario from its JSON form, see `to_dict`.
+
+        Raises:
+            ValueError: on unknown keys or an invalid world.
+        """
+        unknown = set(data) - set(cls.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"Unknown scenario keys: {sorted(unknown)}")
+        return cls(**data)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Scenario":
+        """Load a scenario from a JSON file."""
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def named(cls, name: str) -> "Scenario":
+        """Load `<name>.json` from `SIM_SCENARIO_DIR`."""
+        if not re.fullmatch(r"[\w-]+", name):
+            raise ValueError(f"Invalid scenario name: {name}")
+        path = SIM_SCENARIO_DIR / f"{name}.json"
+        if not path.is_file():
+            raise ValueError(f"Unknown scenario: {name}")
+        return cls.load(path)
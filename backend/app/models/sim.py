@@ -1,15 +1,22 @@
 import random
+from dataclasses import replace
+
 import numpy as np
-import matplotlib.pyplot as plt
 
-from .utils import grid_bfs, wall_distance_grid, obstacle_distance_grid, outofbounds
+from . import engine, kernels
+from .colormap import apply_lut
+from .field_cache import FieldCache, field_cache as shared_field_cache
+from .neighbors import CellList, interaction_cutoff
+from .profiling import NULL_PROFILER
+from .scenario import GRID_SIZE, HEIGHT, WIDTH, Scenario
+from .state import AgentState
+from .utils import (flow_field, wall_distance_grid, obstacle_distance_grid, obstacle_rects,
+                    outofbounds)
 
 import logging
 logger = logging.getLogger('uvicorn')
 
-WIDTH = 500
-HEIGHT = 400
-GRID_SIZE = 10
+# dimensions of the default scenario
 ROWS = HEIGHT // GRID_SIZE
 COLS = WIDTH // GRID_SIZE
 AGENT_RADIUS = 5
@@ -19,12 +26,22 @@ RANDOM_SEED = 42
 
 L_SCALE = 8e-2  # grid unit to metric unit [meter]
 DELTA_T = 0.001  # time step [second]
+# finest adaptive substep is dt / 2 ** MAX_LEVEL
+MAX_LEVEL = 6
 
 A = 2 / L_SCALE
 B = -0.3 / L_SCALE
 
 
+AGENT_R = 0.4 / L_SCALE
+AGENT_MASS = 60  # [kg]
+AGENT_TAU = 0.5  # [second]
+AGENT_V_DES = 1.4 / L_SCALE
+
+
 class Agent:
+    """A single agent, stored as a view over one slot of an `AgentState`."""
+
     _instance_count = 0
 
     def __init__(self, grid_position: np.ndarray, position: np.ndarray):
@@ -34,21 +51,72 @@ class Agent:
             grid_position (np.array[int, int]): position on grid; (row, col)
             position (np.array[int, int]): absolute pos on canvas; (x, y)
         """
+        # length measures are all in grid units
+        state = AgentState.spawn(np.array([grid_position]), np.array([position]),
+                                 r=AGENT_R, m=AGENT_MASS, tau=AGENT_TAU,
+                                 v_des=AGENT_V_DES)
+        self._bind(state, 0)
+
+    @classmethod
+    def view(cls, state: AgentState, index: int) -> "Agent":
+        """Create an agent backed by slot `index` of an existing state."""
+        agent = cls.__new__(cls)
+        agent._bind(state, index)
+        return agent
+
+    def _bind(self, state: AgentState, index: int):
         self.id = f"agent_{Agent._instance_count}"
-        self.grid_position = np.array(grid_position, dtype=np.int32)  # position on grid
-        self.position = np.array(position, dtype=np.float32)    # absolute pos on canvas
         Agent._instance_count += 1
+        self._state = state
+        self._index = index
 
-        self.exited = False
+    @property
+    def position(self) -> np.ndarray:
+        return self._state.position[self._index]
 
-        # length measures are all in grid units
-        self.r = 0.4 / L_SCALE
-        self.m = 60 # [kg]
+    @position.setter
+    def position(self, value: np.ndarray):
+        self._state.position[self._index] = value
+
+    @property
+    def grid_position(self) -> np.ndarray:
+        return self._state.grid_position[self._index]
+
+    @grid_position.setter
+    def grid_position(self, value: np.ndarray):
+        self._state.grid_position[self._index] = value
+
+    @property
+    def v_t(self) -> np.ndarray:
+        return self._state.v_t[self._index]
 
-        self.tau = 0.5
+    @v_t.setter
+    def v_t(self, value: np.ndarray):
+        self._state.v_t[self._index] = value
 
-        self.v_des = np.array([1.4/L_SCALE, 1.4/L_SCALE], dtype=np.float32)
-        self.v_t = np.array([0.0, 0.0], dtype=np.float32)
+    @property
+    def v_des(self) -> np.ndarray:
+        return self._state.v_des[self._index]
+
+    @property
+    def r(self) -> float:
+        return float(self._state.r[self._index])
+
+    @property
+    def m(self) -> float:
+        return float(self._state.m[self._index])
+
+    @property
+    def tau(self) -> float:
+        return float(self._state.tau[self._index])
+
+    @property
+    def exited(self) -> bool:
+        return bool(self._state.exited[self._index])
+
+    @exited.setter
+    def exited(self, value: bool):
+        self._state.exited[self._index] = value
 
     def fij(self, agent_j):
         d_ij = np.linalg.norm(self.position - agent_j.position)
@@ -134,23 +202,107 @@ class Obstacle:
         Obstacle._instance_count += 1
 
 
+def _field(group: str, name: str) -> property:
+    """A static field of the simulation, built with its group on first access."""
+
+    def get(self) -> np.ndarray | None:
+        return self._field_group(group).get(name)
+
+    def set(self, value: np.ndarray | None):
+        self._field_group(group)[name] = value
+
+    return property(get, set)
+
+
 class Simulation:
-    def __init__(self, num_agents: int, num_obstacles: int, state: bool):
+    # static fields by group; each group is built, cached and shared as one
+    FIELD_GROUPS = {
+        "flow": ("path_dir_grid", "exit_distance_grid"),
+        "walls": ("wall_distance_grid", "wall_direction_grid"),
+        "obstacles": ("obstacle_distance_grid", "obstacle_direction_grid"),
+    }
+
+    path_dir_grid = _field("flow", "path_dir_grid")
+    exit_distance_grid = _field("flow", "exit_distance_grid")
+    wall_distance_grid = _field("walls", "wall_distance_grid")
+    wall_direction_grid = _field("walls", "wall_direction_grid")
+    obstacle_distance_grid = _field("obstacles", "obstacle_distance_grid")
+    obstacle_direction_grid = _field("obstacles", "obstacle_direction_grid")
+
+    def __init__(self, num_agents: int, num_obstacles: int, state: bool,
+                 cutoff: float | None = None, backend: str = "auto",
+                 field_cache: FieldCache | None = shared_field_cache,
+                 seed: int | None = None, scenario: Scenario | None = None,
+                 integrator: str = "euler", dt: float = DELTA_T, adaptive: bool = False):
+        """Initialize a simulation.
+
+        Args:
+            num_agents (int): number of agents.
+            num_obstacles (int): number of random obstacles; ignored if the scenario
+                lays out its own.
+            state (bool): whether the simulation is running.
+            cutoff (float | None): agent-agent interaction cutoff distance; defaults
+                to the distance where the repulsion becomes negligible.
+            backend (str): "numpy", "numba" or "auto"; "auto" and "numba" use the
+                compiled kernels when numba is installed and NumPy otherwise.
+            field_cache (FieldCache | None): cache to share the static fields of the
+                layout through; None computes them for this simulation only.
+            seed (int | None): seed for the layout and agent placement; None draws from
+                the global `random` state.
+            scenario (Scenario | None): world to simulate; defaults to `Scenario()`.
+            integrator (str): one of `engine.INTEGRATORS`.
+            dt (float): simulated time advanced by `step` [second].
+            adaptive (bool): split `dt` per agent into power-of-two substeps sized by
+                `stable_dt`, so that only crowded agents take small steps.
+        """
+        self.scenario = scenario if scenario is not None else Scenario()
         self.num_agents = num_agents
-        self.num_obstacles = num_obstacles
+        self.num_obstacles = (num_obstacles if self.scenario.obstacles is None
+                              else len(self.scenario.obstacles))
         self.state = state
 
+        self.seed = seed
+        self.rng = random if seed is None else random.Random(seed)
+
         self.agents = []
+        self.agent_state = None
+        # slots of the agents still inside, ascending; exited agents are dropped
+        # from it after every step so that stepping costs O(active)
+        self.active = np.zeros(0, dtype=np.intp)
         self.obstacles = []
 
-        self.grid = np.zeros((ROWS, COLS), dtype=np.int8)
-        self.grid[14:25, -1] = 1    # exit
-        self.path_dir_grid = None
+        self.grid = self.scenario.grid()
+        self._fields: dict[str, dict[str, np.ndarray]] = {}
+        self._path_colors = None
+        self._path_image = None
+
+        if cutoff is None:
+            cutoff = interaction_cutoff(AGENT_R, A, B)
+        self.cell_list = CellList(cutoff, (self.scenario.height, self.scenario.width),
+                                  self.scenario.grid_size)
+
+        if backend not in ("auto", "numpy", "numba"):
+            raise ValueError(f"Unknown backend: {backend}")
+        if backend == "numba" and not kernels.HAS_NUMBA:
+            logger.warning("numba is not installed; falling back to the numpy backend")
+        self.backend = "numba" if backend != "numpy" and kernels.HAS_NUMBA else "numpy"
+        self.field_cache = field_cache
+
+        if integrator not in engine.INTEGRATORS:
+            raise ValueError(f"Unknown integrator: {integrator}")
+        if not dt > 0 or not np.isfinite(dt):
+            raise ValueError(f"dt must be positive, got {dt}")
+        self.integrator = integrator
+        self.dt = float(dt)
+        self.adaptive = adaptive
+        # simulated time [second] and agent force evaluations so far
+        self.time = 0.0
+        self.evaluations = 0
+        # times the stages of `step`; replaced by a session that profiles
+        self.profiler = NULL_PROFILER
+        # appends every step to a recording, see `app.recording.Recorder`
+        self.recorder = None
 
-        self.wall_distance_grid = None
-        self.wall_direction_grid = None
-        self.obstacle_distance_grid = None
-        self.obstacle_direction_grid = None
         self.initialize()
 
     def initialize(self):
@@ -158,68 +310,324 @@ class Simulation:
         self.obstacles = self.__get_obstacles()
         # agents
         self.agents = self.__get_agents()
+        self.compact()
+        # static fields are built on first use
+        self._fields = {}
+
+    def build_fields(self):
+        """Build every static field now instead of on first use."""
+        for group in self.FIELD_GROUPS:
+            self._field_group(group)
+
+    def _field_group(self, group: str) -> dict[str, np.ndarray]:
+        fields = self._fields.get(group)
+        if fields is None:
+            build = getattr(self, f"_build_{group}")
+            if self.field_cache is not None:
+                scenario = self.scenario
+                key = FieldCache.key(self.grid, self.obstacles, group, scenario.grid_size,
+                                     scenario.nearest_obstacles)
+                fields = self.field_cache.get_or_build(key, build)
+            else:
+                fields = build()
+            # a copy of the shared dict, so fields can be replaced per simulation
+            fields = self._fields[group] = dict(fields)
+        return fields
+
+    def _build_flow(self) -> dict[str, np.ndarray]:
         # delta_v on grid
-        self.path_dir_grid = grid_bfs(self.grid)
+        field = flow_field(self.grid)
+        if field is None:
+            return {}
+        return {"path_dir_grid": field[0],
+                "exit_distance_grid": field[1].astype(np.float32)}
+
+    def _build_walls(self) -> dict[str, np.ndarray]:
         # another grid for distance to walls and obstacles
-        self.wall_distance_grid, self.wall_direction_grid = wall_distance_grid(self.grid)
-        self.obstacle_distance_grid, self.obstacle_direction_grid = obstacle_distance_grid(self.grid, self.obstacles)
-        logger.info(f"direction_grid: {self.obstacle_direction_grid[0,:, 0, 0]}")
-    
+        distance, direction = wall_distance_grid(self.grid, self.scenario.grid_size)
+        return {"wall_distance_grid": distance, "wall_direction_grid": direction}
+
+    def _build_obstacles(self) -> dict[str, np.ndarray]:
+        nearest = self.scenario.nearest_obstacles
+        if self.backend == "numba":
+            nearest = len(self.obstacles) if nearest is None else min(nearest,
+                                                                      len(self.obstacles))
+            distance, direction = kernels.obstacle_distance_grid(
+                obstacle_rects(self.obstacles), *self.grid.shape, self.scenario.grid_size,
+                nearest)
+        else:
+            distance, direction = obstacle_distance_grid(self.grid, self.obstacles, nearest,
+                                                         self.scenario.grid_size)
+        return {"obstacle_distance_grid": distance, "obstacle_direction_grid": direction}
+
+    @property
+    def finished(self) -> bool:
+        """Whether every agent has left the room."""
+        return self.active.size == 0
+
+    def compact(self):
+        """Rebuild the active set from the exited flags.
+
+        `step` keeps it up to date and drops agents flagged as exited in between;
+        call this after clearing `agent_state.exited` flags directly.
+        """
+        self.active = np.flatnonzero(~self.agent_state.exited)
+
     def step(self):
-        for i in range(len(self.agents)):
-            # note: please first convert all grid units to metric units
-            agent = self.agents[i]
-            if agent.exited:
-                continue
-
-            agent.step(self.agents, 
-                       self.path_dir_grid,
-                       self.wall_distance_grid, 
-                       self.wall_direction_grid, 
-                       self.obstacle_distance_grid, 
-                       self.obstacle_direction_grid)
-            
-            if self.grid[int(self.agents[i].grid_position[0]), 
-                         int(self.agents[i].grid_position[1])] == 1:
-                self.agents[i].exited = True
-
-
-    def get_path_image(self) -> list[int]:
+        """Advance the simulation by `dt`."""
+        # note: please first convert all grid units to metric units
+        state = self.agent_state
+        # drop agents flagged as exited from outside since the last step
+        active = self.active = self.active[~state.exited[self.active]]
+        if active.size == 0:
+            return
+        # exited agents neither move nor repel, so only the active ones are bucketed
+        with self.profiler.stage("cell_list"):
+            self.cell_list.build(state.position[active])
+        if not self.adaptive:
+            self.__advance(active, np.arange(active.size), self.dt)
+        else:
+            level = self.__levels(active)
+            top = int(level.max())
+            # every agent covers dt in 2 ** level substeps; the cell list of the
+            # whole step is reused, as no agent moves further than its clearance
+            for sub in range(2 ** top):
+                for lv in range(top, -1, -1):
+                    if sub % 2 ** (top - lv):
+                        continue
+                    targets = np.flatnonzero(level == lv)
+                    targets = targets[~state.exited[active[targets]]]
+                    if targets.size:
+                        self.__advance(active, targets, self.dt / 2 ** lv)
+        self.time += self.dt
+        self.active = active[~state.exited[active]]
+        if self.recorder is not None:
+            self.recorder.record(self)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by this simulation alone; cached fields are shared [byte]."""
+        arrays = [*vars(self.agent_state).values(), self.active, self.grid]
+        if self.field_cache is None:
+            arrays += [value for fields in self._fields.values() for value in fields.values()]
+        if self._path_colors is not None:
+            arrays.append(self._path_colors)
+        return sum(array.nbytes for array in arrays)
+
+    def checkpoint(self) -> tuple[dict, dict[str, np.ndarray]]:
+        """Everything needed to resume this simulation exactly, see `restore`.
+
+        Static fields are built if they were not yet, so that a restored
+        simulation does not have to recompute them.
+
+        Returns:
+            tuple[dict, dict[str, np.ndarray]]: JSON-serializable settings and the
+                arrays of the agents, the grid and the static fields.
+        """
+        self.build_fields()
+        version, internal, gauss_next = self.rng.getstate()
+        meta = {
+            "num_agents": self.num_agents,
+            "num_obstacles": self.num_obstacles,
+            "state": self.state,
+            "seed": self.seed,
+            "scenario": self.scenario.to_dict(),
+            "obstacles": [(o.x0, o.y0, o.size[0], o.size[1]) for o in self.obstacles],
+            "cutoff": self.cell_list.cutoff,
+            "backend": self.backend,
+            "integrator": self.integrator,
+            "dt": self.dt,
+            "adaptive": self.adaptive,
+            "time": self.time,
+            "evaluations": self.evaluations,
+            "rng": [version, list(internal), gauss_next],
+            "fields": {group: sorted(fields) for group, fields in self._fields.items()},
+        }
+        arrays = {f"state/{name}": value for name, value in vars(self.agent_state).items()}
+        arrays["active"] = self.active
+        arrays["grid"] = self.grid
+        for group, fields in self._fields.items():
+            for name, value in fields.items():
+                arrays[f"field/{group}/{name}"] = np.ascontiguousarray(value)
+        return meta, arrays
+
+    @classmethod
+    def restore(cls, meta: dict, arrays: dict[str, np.ndarray],
+                field_cache: FieldCache | None = shared_field_cache) -> "Simulation":
+        """Recreate a simulation from its `checkpoint`."""
+        scenario = Scenario.from_dict(meta["scenario"])
+        # lay out the obstacles of the checkpoint instead of drawing new ones
+        layout = replace(scenario, obstacles=[tuple(rect) for rect in meta["obstacles"]])
+        sim = cls(0, 0, meta["state"], cutoff=meta["cutoff"], backend=meta["backend"],
+                  field_cache=field_cache, seed=meta["seed"], scenario=layout,
+                  integrator=meta["integrator"], dt=meta["dt"], adaptive=meta["adaptive"])
+        sim.scenario = scenario
+        sim.num_agents = meta["num_agents"]
+        sim.num_obstacles = meta["num_obstacles"]
+        sim.time = meta["time"]
+        sim.evaluations = meta["evaluations"]
+        version, internal, gauss_next = meta["rng"]
+        sim.rng = random.Random()
+        sim.rng.setstate((version, tuple(internal), gauss_next))
+
+        sim.grid = np.array(arrays["grid"])
+        state = sim.agent_state = AgentState(0)
+        for name in vars(state):
+            setattr(state, name, np.array(arrays[f"state/{name}"]))
+        sim.agents = [Agent.view(state, i) for i in range(len(state))]
+        sim.active = np.array(arrays["active"], dtype=np.intp)
+        sim._fields = {group: {name: np.array(arrays[f"field/{group}/{name}"])
+                               for name in names}
+                       for group, names in meta["fields"].items()}
+        return sim
+
+    def stable_dt(self) -> float:
+        """Largest fixed step the current crowd can take, see `engine.stable_dt`."""
+        active = self.active[~self.agent_state.exited[self.active]]
+        if active.size == 0:
+            return float("inf")
+        self.cell_list.build(self.agent_state.position[active])
+        return float(self.__step_limits(active).min())
+
+    def __step_limits(self, active: np.ndarray) -> np.ndarray:
+        state = self.agent_state
+        with self.profiler.stage("step_limits"):
+            if self.backend == "numba":
+                cell_list = self.cell_list
+                gap = kernels.clearance(state.position, state.grid_position, state.r, active,
+                                        cell_list.order, cell_list.cell_start,
+                                        cell_list.cell_count, cell_list.cells,
+                                        np.array(cell_list.shape), cell_list.cutoff,
+                                        self.wall_distance_grid, self.obstacle_distance_grid)
+            else:
+                position = state.position[active]
+                i, j = self.cell_list.pairs(position, np.arange(active.size))
+                gap = engine.clearance(position, state.r[active], i, j,
+                                       state.grid_position[active],
+                                       self.wall_distance_grid, self.obstacle_distance_grid)
+            return engine.stable_dt(state.v_t[active], state.v_des[active], state.m[active],
+                                    state.tau[active], gap, A, B, self.scenario.grid_size)
+
+    def __levels(self, active: np.ndarray) -> np.ndarray:
+        """Substep level of every active agent: it takes 2 ** level steps per `dt`."""
+        limit = self.__step_limits(active)
+        with np.errstate(divide="ignore"):
+            level = np.ceil(np.log2(self.dt / limit))
+        return np.clip(level, 0, MAX_LEVEL).astype(np.intp)
+
+    def __advance(self, active: np.ndarray, targets: np.ndarray, dt: float):
+        """Move `active[targets]` by `dt`; the cell list is built over `active`."""
+        state = self.agent_state
+        profiler = self.profiler
+        self.evaluations += targets.size
+        if self.backend == "numba":
+            cell_list = self.cell_list
+            with profiler.stage("kernel"):
+                kernels.step(state.position, state.v_t, state.grid_position, state.exited,
+                             state.last_dt, state.v_des, state.m, state.tau, state.r,
+                             active, targets,
+                             cell_list.order, cell_list.cell_start, cell_list.cell_count,
+                             cell_list.cells, np.array(cell_list.shape), cell_list.cutoff,
+                             self.grid, self.path_dir_grid,
+                             self.wall_distance_grid, self.wall_direction_grid,
+                             self.obstacle_distance_grid, self.obstacle_direction_grid,
+                             A, B, self.scenario.grid_size, dt,
+                             engine.INTEGRATORS.index(self.integrator))
+            return
+
+        agents = active[targets]
+        position = state.position[active]
+        grid_position = state.grid_position[agents]
+        v_t = state.v_t[agents]
+        m = state.m[agents]
+
+        with profiler.stage("desired_force"):
+            f_des = engine.desired_force(v_t, state.v_des[agents], m, state.tau[agents],
+                                         grid_position, self.path_dir_grid)
+        with profiler.stage("neighbor_force"):
+            i, j = self.cell_list.pairs(position, targets)
+            # agents that left during an earlier substep no longer repel
+            live = ~state.exited[active[j]]
+            fij_sum = engine.neighbor_force(position, state.r[active], i[live], j[live],
+                                            A, B)[targets]
+        with profiler.stage("wall_force"):
+            fiw_sum = engine.wall_force(grid_position, state.r[agents],
+                                        self.wall_distance_grid,
+                                        self.wall_direction_grid,
+                                        self.obstacle_distance_grid,
+                                        self.obstacle_direction_grid, A, B)
+
+        with profiler.stage("integrate"):
+            new_pos, new_grid_pos, new_v_t = engine.integrate(
+                position[targets], v_t, f_des + fij_sum + fiw_sum, m,
+                self.grid.shape, self.scenario.grid_size, dt,
+                self.integrator, state.last_dt[agents])
+
+            state.position[agents] = new_pos
+            state.grid_position[agents] = new_grid_pos
+            state.v_t[agents] = new_v_t
+            state.last_dt[agents] = dt
+            state.exited[agents] = self.grid[new_grid_pos[:, 0], new_grid_pos[:, 1]] == 1
+
+    def path_colors(self) -> np.ndarray:
+        """Color of each cell by the angle of its path direction; memoized.
+
+        Returns:
+            np.ndarray: 8-bit RGB colors. shape: (rows, cols, 3)
+        """
         assert self.path_dir_grid is not None
-        
-        # # Calculate and normalize angles
-        grid_img = np.arccos(self.path_dir_grid[0] / 
-                           np.sqrt(self.path_dir_grid[0]**2 + self.path_dir_grid[1]**2))
-        grid_img = grid_img / np.pi
-        img_flat = grid_img.flatten()
-        # convert to array of colors [hex]
-        cmap = plt.cm.viridis
-        colors = ['#{:02x}{:02x}{:02x}'.format(
-            int(255*r), int(255*g), int(255*b)
-        ) for r, g, b, a in [cmap(pixel) for pixel in img_flat]]
-        return colors
+        if self._path_colors is None:
+            # # Calculate and normalize angles
+            grid_img = np.arccos(self.path_dir_grid[0] / 
+                               np.sqrt(self.path_dir_grid[0]**2 + self.path_dir_grid[1]**2))
+            grid_img = grid_img / np.pi
+            self._path_colors = apply_lut(grid_img)
+            self._path_colors.setflags(write=False)
+        return self._path_colors
+
+    def get_path_image(self) -> list[str]:
+        if self._path_image is None:
+            # convert to array of colors [hex]
+            rgb = self.path_colors().reshape(-1, 3).astype(np.uint32)
+            packed = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+            self._path_image = [f"#{color:06x}" for color in packed.tolist()]
+        return self._path_image
 
     def __get_agents(self) -> list[Agent]:
         assert self.obstacles is not None
-        agents = []
+        rows, cols = self.grid.shape
+        grid_positions = []
         grid_cp = self.grid.copy()
         for _ in range(self.num_agents):
-            row = random.randint(0, ROWS - 1)
-            col = random.randint(0, COLS - 1)
+            row = self.rng.randint(0, rows - 1)
+            col = self.rng.randint(0, cols - 1)
             while grid_cp[row, col] != 0:
-                row = random.randint(0, ROWS - 1)
-                col = random.randint(0, COLS - 1)
+                row = self.rng.randint(0, rows - 1)
+                col = self.rng.randint(0, cols - 1)
             grid_cp[row, col] = 1
-            agents.append(Agent(np.array([row, col]), 
-                                np.array([(row + 0.5) * GRID_SIZE, (col + 0.5) * GRID_SIZE])))
-        return agents
+            grid_positions.append((row, col))
+        grid_positions = np.array(grid_positions, dtype=np.int32).reshape(-1, 2)
+        self.agent_state = AgentState.spawn(grid_positions,
+                                            (grid_positions + 0.5) * self.scenario.grid_size,
+                                            r=AGENT_R, m=AGENT_MASS, tau=AGENT_TAU,
+                                            v_des=AGENT_V_DES)
+        return [Agent.view(self.agent_state, i) for i in range(self.num_agents)]
 
     def __get_obstacles(self) -> list[Obstacle]:
-        """Generate a list of obstacles.
+        """Generate a list of obstacles, or lay out those of the scenario.
 
         Returns:
             list[Obstacle]: A list of obstacles.
         """
+        scenario = self.scenario
+        gs = scenario.grid_size
+        if scenario.obstacles is not None:
+            obstacles = [Obstacle(size=(w, h), position=(x, y))
+                         for x, y, w, h in scenario.obstacles]
+            for rect in scenario.obstacles:
+                self.grid[scenario.cells(rect)] = -1
+            return obstacles
+
         def overlaps(a: Obstacle, b: Obstacle) -> bool:   
             return not (a.position[0] + a.size[0] < b.position[0] or
                         a.position[0] > b.position[0] + b.size[0] or
@@ -227,21 +635,21 @@ class Simulation:
                         a.position[1] > b.position[1] + b.size[1])
         obstacles = []
         while len(obstacles) < self.num_obstacles:
-            size=(random.randint(7, 17) * 10, random.randint(7, 17) * 10)
+            size=(self.rng.randint(7, 17) * gs, self.rng.randint(7, 17) * gs)
             obstacle = Obstacle(
                 size=size,
                     position=(
-                        random.randint(0, (WIDTH - size[0] - 10)//10)*10,
-                        random.randint(0, (HEIGHT - size[1])//10)*10,
+                        self.rng.randint(0, (scenario.width - size[0] - gs)//gs)*gs,
+                        self.rng.randint(0, (scenario.height - size[1])//gs)*gs,
                     ),
                 )
             if not any(overlaps(obstacle, o) for o in obstacles):
                 obstacles.append(obstacle)
-                grid_pos_y1 = obstacle.position[1]//10
-                grid_pos_y2 = grid_pos_y1 + obstacle.size[1]//10
+                grid_pos_y1 = obstacle.position[1]//gs
+                grid_pos_y2 = grid_pos_y1 + obstacle.size[1]//gs
 
-                grid_pos_x1 = obstacle.position[0]//10
-                grid_pos_x2 = grid_pos_x1 + obstacle.size[0]//10
+                grid_pos_x1 = obstacle.position[0]//gs
+                grid_pos_x2 = grid_pos_x1 + obstacle.size[0]//gs
 
                 self.grid[grid_pos_y1:grid_pos_y2, grid_pos_x1:grid_pos_x2] = -1
 
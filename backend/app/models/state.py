@@ -0,0 +1,61 @@
+"""Structure-of-arrays storage for the agents of a simulation."""
+import numpy as np
+
+
+class AgentState:
+    """Contiguous per-agent arrays shared by the simulation engine.
+
+    Every attribute is indexed by the agent's slot, which never changes for the
+    lifetime of the simulation. `Agent` objects are thin views over one slot.
+
+    Attributes:
+        position (np.ndarray): absolute pos on canvas; (row, col). shape: (N, 2)
+        grid_position (np.ndarray): position on grid; (row, col). shape: (N, 2)
+        v_t (np.ndarray): current velocity. shape: (N, 2)
+        v_des (np.ndarray): desired speed along each axis. shape: (N, 2)
+        r (np.ndarray): agent radius. shape: (N,)
+        m (np.ndarray): agent mass [kg]. shape: (N,)
+        tau (np.ndarray): relaxation time [second]. shape: (N,)
+        exited (np.ndarray): whether the agent has left the room. shape: (N,)
+        last_dt (np.ndarray): length of the agent's previous step, 0 before its
+            first [second]. shape: (N,)
+    """
+
+    def __init__(self, num_agents: int):
+        self.position = np.zeros((num_agents, 2), dtype=np.float64)
+        self.grid_position = np.zeros((num_agents, 2), dtype=np.int32)
+        self.v_t = np.zeros((num_agents, 2), dtype=np.float64)
+        self.v_des = np.zeros((num_agents, 2), dtype=np.float64)
+        self.r = np.zeros(num_agents, dtype=np.float64)
+        self.m = np.zeros(num_agents, dtype=np.float64)
+        self.tau = np.zeros(num_agents, dtype=np.float64)
+        self.exited = np.zeros(num_agents, dtype=np.bool_)
+        self.last_dt = np.zeros(num_agents, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return self.position.shape[0]
+
+    @classmethod
+    def spawn(cls, grid_positions: np.ndarray, positions: np.ndarray,
+              r: float, m: float, tau: float, v_des: float) -> "AgentState":
+        """Create the state for a batch of identical agents at rest.
+
+        Args:
+            grid_positions (np.ndarray): positions on grid; (row, col). shape: (N, 2)
+            positions (np.ndarray): absolute positions on canvas. shape: (N, 2)
+            r (float): agent radius.
+            m (float): agent mass [kg].
+            tau (float): relaxation time [second].
+            v_des (float): desired speed along each axis.
+
+        Returns:
+            AgentState: state with one slot per agent.
+        """
+        state = cls(len(positions))
+        state.grid_position[:] = grid_positions
+        state.position[:] = positions
+        state.r[:] = r
+        state.m[:] = m
+        state.tau[:] = tau
+        state.v_des[:] = v_des
+        return state
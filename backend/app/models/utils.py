@@ -1,4 +1,6 @@
 from collections import deque
+import heapq
+import math
 import numpy as np
 import logging
 
@@ -9,166 +11,207 @@ EXIT = 1
 
 GRID_SIZE = 10
 
+# distance standing in for a wall that is not there
+NO_WALL = 1000
+
+NEIGHBORS = [(0, 1), (0, -1), (1, 0), (-1, 0),
+             (1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+
+def flow_field(grid: np.ndarray) -> tuple[np.ndarray, np.ndarray] | None:
+    """Helper function to build the direction and distance-to-exit fields in one pass.
+
+    Runs a single Dijkstra search outward from every exit cell at once, with octile
+    step costs (1 for straight moves, sqrt(2) for diagonal ones), so each cell is
+    settled exactly once.
+
+    Args:
+        grid (np.ndarray): Input grid where -1 represents obstacles, 1 represents exit,
+            and 0 represents empty cells.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray] | None: Grid with each cell containing a direction
+            vector (dy, dx) pointing to the next step along the shortest path to the
+            exit (-2 on exit and obstacle cells), and the distance to the nearest exit
+            in cells (inf on obstacles). None if some empty cell cannot reach an exit.
+    """
+    rows, cols = grid.shape
+    distance = np.full((rows, cols), np.inf)
+    direction_grid = np.full((2, rows, cols), -2, dtype=np.int8)
+
+    heap = [(0.0, int(y), int(x)) for y, x in np.argwhere(grid == EXIT)]
+    for _, y, x in heap:
+        distance[y, x] = 0.0
+    heapq.heapify(heap)
+    while heap:
+        d, y, x = heapq.heappop(heap)
+        if d > distance[y, x]:
+            continue
+        for dy, dx in NEIGHBORS:
+            ny, nx = y + dy, x + dx
+            if not ((0 <= ny < rows) and (0 <= nx < cols)) or grid[ny, nx] != 0:
+                continue
+            nd = d + (math.sqrt(2) if dy and dx else 1.0)
+            if nd < distance[ny, nx]:
+                distance[ny, nx] = nd
+                # step back towards the cell we came from
+                direction_grid[0, ny, nx] = -dy
+                direction_grid[1, ny, nx] = -dx
+                heapq.heappush(heap, (nd, ny, nx))
+
+    if np.isinf(distance[grid == 0]).any():
+        return None
+    return direction_grid, distance
+
+
 def grid_bfs(grid: np.ndarray)->np.ndarray:
     """Helper function to find the shortest path from each point to the exit.
 
-    Uses BFS to find shortest paths and updates the grid with direction vectors
-    pointing toward the next step along the path to the exit.
-
     Args:
         grid (np.ndarray): Input grid where -1 represents obstacles, 1 represents exit,
             and 0 represents empty cells.
 
     Returns:
         np.ndarray: Grid with each cell containing a direction vector (dx, dy) pointing
-            to the next step along the shortest path to the exit.
+            to the next step along the shortest path to the exit; None if some cell
+            cannot reach the exit. See `flow_field`.
     """
-    def bfs(start: tuple[int, int])->np.ndarray:
-        """Helper function to perform BFS on the grid.
-
-        Args:
-            start (tuple[int, int]): Starting point (y, x); sorry, but normally you index [col, row]
-                in a 2-d array.
-
-        Returns:
-            np.ndarray: Grid with each cell containing a direction vector (dx, dy) pointing
-                to the next step along the shortest path to the exit.
-        """
-        queue = deque([start])
-        visited = np.zeros_like(grid, dtype=np.int8)
-        visited[start] = 1
-        next_step = np.zeros((2, grid.shape[0], grid.shape[1]), dtype=np.int8) 
-        while queue:
-            y, x = queue.popleft()
-            for dy, dx in [(0, 1), (0, -1), (1, 0), (-1, 0), 
-                           (1, 1), (1, -1), (-1, 1), (-1, -1)]:
-                nx, ny = x + dx, y + dy
-                if (0 <= ny < grid.shape[0]) and (0 <= nx < grid.shape[1]) and \
-                    (grid[ny, nx] != OBSTACLE) and (visited[ny, nx] == 0):
-                    queue.append((ny, nx))
-                    visited[ny, nx] = 1
-                    next_step[0, ny, nx] = -dy
-                    next_step[1, ny, nx] = -dx
-                    if grid[ny, nx] == EXIT:
-                        return next_step, (ny, nx)
-                    
-        return next_step, (-1, -1)
-    
-    # start from [0, 0]
-    direction_grid = np.ones((2, grid.shape[0], grid.shape[1]), dtype=np.int8) * -2
-    for i in range(grid.shape[0]):  # col
-        for j in range(grid.shape[1]):  # row
-            if grid[i, j] == EXIT or grid[i, j] == OBSTACLE or direction_grid[0, i, j] != -2:
-                continue
-            else:
-                next_step, (ny, nx) = bfs((i, j))
-                # from (nx, ny) to (i, j)
-                if (ny, nx) == (-1, -1):
-                    return None
-                while (ny, nx) != (i, j):
-                    dy, dx = next_step[0, ny, nx], next_step[1, ny, nx]
-                    nx, ny = nx + dx, ny + dy
-                    direction_grid[:, ny, nx] = (-dy, -dx)
-    
-    return direction_grid
-
-
-def distance_to_obstacle(pos: np.ndarray, obstacle) -> float:
+    field = flow_field(grid)
+    return None if field is None else field[0]
+
+
+def distance_to_obstacle(pos: np.ndarray, obstacle,
+                         grid_size: float = GRID_SIZE) -> float:
     """Helper function to find the distance to the nearest point on the obstacle.
 
     Args:
         pos (np.ndarray): Position of the grid cell; in (i, j) grid coordinates.
         obstacle (Obstacle): Obstacle to calculate distance to.
+        grid_size (float): size of a grid cell.
 
     Returns:
         float: Distance to the nearest point on the obstacle in [i, j].
     """
-    raw_pos = (pos + 0.5) * GRID_SIZE
-    nearest_x = max(obstacle.position[1], 
-                    min(obstacle.position[1] + obstacle.size[1], 
-                        raw_pos[1]))  # x maps to position[1]
-    nearest_y = max(obstacle.position[0], 
-                    min(obstacle.position[0] + obstacle.size[0], 
-                        raw_pos[0]))  # y maps to position[0]
-    
-    nearest_point = np.array([nearest_y, nearest_x])  # Swap back to (y,x) order
+    raw_pos = (pos + 0.5) * grid_size
+    # obstacle positions and sizes are (x, y); rows run along y
+    nearest_y = max(obstacle.position[1],
+                    min(obstacle.position[1] + obstacle.size[1], raw_pos[0]))
+    nearest_x = max(obstacle.position[0],
+                    min(obstacle.position[0] + obstacle.size[0], raw_pos[1]))
+
+    nearest_point = np.array([nearest_y, nearest_x])
     d = np.linalg.norm(raw_pos - nearest_point)
     # direction vector
     return d, raw_pos - nearest_point
 
 
-def wall_distance_grid(grid: np.ndarray)->tuple[np.ndarray, np.ndarray]:
+def obstacle_rects(obstacles: list) -> np.ndarray:
+    """Helper function to pack obstacles into an array of rectangles.
+
+    Args:
+        obstacles (list): List of obstacles.
+
+    Returns:
+        np.ndarray: (row0, col0, row1, col1) of each obstacle on canvas, matching the
+            extent used by `distance_to_obstacle`. shape: (len(obstacles), 4)
+    """
+    rects = np.zeros((len(obstacles), 4))
+    for k, obstacle in enumerate(obstacles):
+        x, y = obstacle.position
+        w, h = obstacle.size
+        rects[k] = (y, x, y + h, x + w)
+    return rects
+
+
+def wall_distance_grid(grid: np.ndarray,
+                       grid_size: float = GRID_SIZE)->tuple[np.ndarray, np.ndarray]:
     """Helper function to find the distance to the nearest wall or obstacle.
 
+    Walls are not felt along the rows or columns facing an exit cell on them.
+
     Args:
         grid (np.ndarray): Input grid where -1 represents obstacles, 1 represents exit,
             and 0 represents empty cells.
-        obstacles (list): List of obstacles.
+        grid_size (float): size of a grid cell.
 
     Returns:
         tuple[np.ndarray, np.ndarray]: Grid with each cell containing the distance to the nearest wall [left, top, right, bottom] and obstacles.
-        and the direction grid.
+        and the direction grid; the latter is a read-only broadcast of the four wall
+        normals.
     """
-    distance_grid = np.zeros((4, grid.shape[0], grid.shape[1]))
-    direction_grid = np.zeros((4, 2, grid.shape[0], grid.shape[1]))
-    # walls
-    for i in range(grid.shape[0]):
-        for j in range(grid.shape[1]):
-            # left wall
-            d = (j)*10
-            if d <= 5:
-                d=0.1
-            distance_grid[0, i, j] = d
-            direction_grid[0, :, i, j] = np.array([0, 1])
-            # top wall
-            d = (i)*10
-            if d <= 5:
-                d=0.1
-            distance_grid[1, i, j] = d
-            direction_grid[1, :, i, j] = np.array([1, 0])
-            # right wall
-
-            if 14<=j<=25:
-                d=1000
-            else:
-                d = (grid.shape[1]-j-1)*10
-                if d <= 5:
-                    d=0.1
-                    
-            distance_grid[2, i, j] = d
-            direction_grid[2, :, i, j] = np.array([0, -1])
-            # bottom wall
-            d = (grid.shape[0]-i-1)*10
-            if d <= 5:
-                d=0.1
-            distance_grid[3, i, j] = d
-            direction_grid[3, :, i, j] = np.array([-1, 0])
+    rows, cols = grid.shape
+    i = np.broadcast_to(np.arange(rows)[:, np.newaxis], (rows, cols))
+    j = np.broadcast_to(np.arange(cols)[np.newaxis, :], (rows, cols))
+
+    distance_grid = np.stack([
+        j * grid_size,                  # left wall
+        i * grid_size,                  # top wall
+        (cols - j - 1) * grid_size,     # right wall
+        (rows - i - 1) * grid_size,     # bottom wall
+    ]).astype(np.float32)
+    distance_grid[distance_grid <= grid_size / 2] = 0.1
+    # far enough for the force to vanish
+    distance_grid[0][grid[:, 0] == EXIT, :] = NO_WALL
+    distance_grid[1][:, grid[0, :] == EXIT] = NO_WALL
+    distance_grid[2][grid[:, -1] == EXIT, :] = NO_WALL
+    distance_grid[3][:, grid[-1, :] == EXIT] = NO_WALL
+
+    normals = np.array([[0, 1], [1, 0], [0, -1], [-1, 0]], dtype=np.float32)
+    direction_grid = np.broadcast_to(normals[:, :, np.newaxis, np.newaxis], (4, 2, rows, cols))
 
     return distance_grid, direction_grid
 
 
-def obstacle_distance_grid(grid: np.ndarray, obstacles: list)->np.ndarray:
+def obstacle_distance_grid(grid: np.ndarray, obstacles: list, nearest: int | None = None,
+                           grid_size: float = GRID_SIZE)->tuple[np.ndarray, np.ndarray]:
     """Helper function to find the distance to the nearest obstacle.
 
+    Each cell centre is clipped to every obstacle rectangle at once to find the
+    nearest point on it.
+
     Args:
         grid (np.ndarray): Input grid where -1 represents obstacles, 1 represents exit,
             and 0 represents empty cells.
         obstacles (list): List of obstacles.
+        nearest (int | None): keep only the `nearest` closest obstacles per cell, so
+            memory scales with the number of cells instead of cells x obstacles.
+        grid_size (float): size of a grid cell.
 
     Returns:
-        np.ndarray: Grid with each cell containing the distance to the nearest obstacle.
+        tuple[np.ndarray, np.ndarray]: float32 distance grid of shape (k, rows, cols)
+            and unit direction grid of shape (k, 2, rows, cols), with
+            k = min(nearest, len(obstacles)). Without `nearest` slab k belongs to
+            obstacle k; otherwise the slabs of a cell are in no particular order.
     """
-    distance_grid = np.zeros((len(obstacles), grid.shape[0], grid.shape[1]))
-    direction_grid = np.zeros((len(obstacles), 2, grid.shape[0], grid.shape[1]))
-    for i in range(grid.shape[0]):
-        for j in range(grid.shape[1]):
-            for k, obstacle in enumerate(obstacles):
-                d, direction_vector = distance_to_obstacle(np.array([i, j]), obstacle)
-                if d <= 3:
-                    d=5
-                distance_grid[k, i, j] = d
-                direction_grid[k, :, i, j] = direction_vector / d
-
+    rows, cols = grid.shape
+    rects = obstacle_rects(obstacles)
+    y = ((np.arange(rows) + 0.5) * grid_size)[:, np.newaxis]
+    x = ((np.arange(cols) + 0.5) * grid_size)[np.newaxis, :]
+
+    def slab(rect: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # rect broadcasts as (..., 1, 1) against the (rows, cols) cell centres
+        lo = rect[..., :2, np.newaxis, np.newaxis]
+        hi = rect[..., 2:, np.newaxis, np.newaxis]
+        dy = y - np.clip(y, lo[..., 0, :, :], hi[..., 0, :, :])
+        dx = x - np.clip(x, lo[..., 1, :, :], hi[..., 1, :, :])
+        d = np.sqrt(dy ** 2 + dx ** 2)
+        d[d <= 3] = 5
+        return (d.astype(np.float32),
+                np.stack([dy / d, dx / d], axis=-3).astype(np.float32))
+
+    if nearest is None or nearest >= len(rects):
+        return slab(rects)
+
+    distance_grid = np.full((nearest, rows, cols), np.inf, dtype=np.float32)
+    direction_grid = np.zeros((nearest, 2, rows, cols), dtype=np.float32)
+    for rect in rects:
+        d, direction = slab(rect)
+        # replace the farthest obstacle kept so far where this one is closer
+        farthest = distance_grid.argmax(axis=0)
+        closer = d < np.take_along_axis(distance_grid, farthest[np.newaxis], 0)[0]
+        r, c = np.nonzero(closer)
+        distance_grid[farthest[r, c], r, c] = d[r, c]
+        direction_grid[farthest[r, c], :, r, c] = direction[:, r, c].T
     return distance_grid, direction_grid
 
 
@@ -0,0 +1,241 @@
+"""Binary frame encoding for the /ws simulation stream.
+
+A client opts in by sending `"protocol": "binary"` with its `init` message. The
+`init` reply is still a JSON `simulation_state` carrying agent IDs and obstacles;
+every following step is sent as a binary frame instead:
+
+    offset  type     field
+    0       uint8    message type (`FRAME`)
+    1       uint8    protocol version
+    2       uint16   flags (`FLAG_RUNNING`, `FLAG_FLOAT32`)
+    4       uint32   frame index
+    8       uint32   number of agents N
+    12      N x 2    (x, y) per agent; int16, or float32 with `FLAG_FLOAT32`
+    ...     uint8    exited bitmask, ceil(N / 8) bytes, least significant bit first
+
+All values are little-endian and agents are in the order of the `init` reply.
+
+With `"delta": true` in `init`, only agents whose integer position or exited flag
+changed since they were last sent are included, and exited agents are sent once.
+Binary delta frames use the message type `DELTA` and list the agents they carry:
+
+    offset  type     field
+    0       uint8    message type (`DELTA`)
+    1       uint8    protocol version
+    2       uint16   flags
+    4       uint32   frame index
+    8       uint32   number of changed agents M
+    12      uint32   index of each changed agent, M entries
+    ...     M x 2    (x, y) per changed agent
+    ...     uint8    exited bitmask of the changed agents, ceil(M / 8) bytes
+
+A full `FRAME` is sent as a keyframe every `keyframe_interval` frames, on the next
+frame after the client sends `{"type": "keyframe"}`, and on the next frame after the
+run loop dropped one for a slow socket.
+
+`get_path` with `"format": "rgb"` or `"png"` answers with a binary `PATH_IMAGE`
+message instead of the JSON list of hex colors:
+
+    offset  type     field
+    0       uint8    message type (`PATH_IMAGE`)
+    1       uint8    protocol version
+    2       uint16   flags (`FLAG_PNG`)
+    4       uint32   rows
+    8       uint32   cols
+    12      bytes    rows x cols x 3 RGB bytes in row-major order, or a PNG file
+"""
+import struct
+import zlib
+
+import numpy as np
+
+from app.models.sim import Simulation
+
+PROTOCOLS = ("json", "binary")
+PRECISIONS = ("int16", "float32")
+VERSION = 1
+
+FRAME = 1
+DELTA = 2
+PATH_IMAGE = 3
+
+PATH_IMAGE_FORMATS = ("hex", "rgb", "png")
+
+FLAG_RUNNING = 1 << 0
+FLAG_FLOAT32 = 1 << 1
+FLAG_PNG = 1 << 2
+
+FRAME_HEADER = struct.Struct("<BBHII")
+
+DEFAULT_KEYFRAME_INTERVAL = 100
+
+
+class DeltaEncoder:
+    """Tracks what the client last received for every agent of a simulation."""
+
+    def __init__(self, keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL):
+        try:
+            keyframe_interval = int(keyframe_interval)
+        except (TypeError, ValueError):
+            raise ValueError(f"keyframe_interval must be an integer, "
+                             f"got {keyframe_interval!r}") from None
+        if keyframe_interval < 1:
+            raise ValueError(f"keyframe_interval must be positive, got {keyframe_interval}")
+        self.keyframe_interval = keyframe_interval
+        self.last_position = None
+        self.last_exited = None
+        self.frames_since_keyframe = 0
+        self.force_keyframe = True
+
+    def update(self, sim: Simulation) -> np.ndarray | None:
+        """Record the next frame and return the agents it has to carry.
+
+        Args:
+            sim (Simulation): simulation about to be encoded.
+
+        Returns:
+            np.ndarray | None: indices of the changed agents, or None if the frame
+                must be a keyframe carrying every agent.
+        """
+        state = sim.agent_state
+        self.frames_since_keyframe += 1
+        if self.force_keyframe or self.frames_since_keyframe >= self.keyframe_interval:
+            self.last_position = _pixel_position(state.position)
+            self.last_exited = state.exited.copy()
+            self.frames_since_keyframe = 0
+            self.force_keyframe = False
+            return None
+
+        # agents already sent as exited never change again
+        live = np.flatnonzero(~self.last_exited)
+        position = _pixel_position(state.position[live])
+        changed = (position != self.last_position[live]).any(axis=1) | state.exited[live]
+        position, changed = position[changed], live[changed]
+        self.last_position[changed] = position
+        self.last_exited[changed] = state.exited[changed]
+        return changed
+
+
+def _pixel_position(position: np.ndarray) -> np.ndarray:
+    """(row, col) canvas positions to truncated (x, y) pixels, as in `AgentDTO`."""
+    return position[:, ::-1].astype(np.int16)
+
+
+def _flags_and_dtype(sim: Simulation, precision: str) -> tuple[int, np.dtype]:
+    flags = FLAG_RUNNING if sim.state else 0
+    if precision == "float32":
+        return flags | FLAG_FLOAT32, np.dtype("<f4")
+    return flags, np.dtype("<i2")
+
+
+def encode_frame(sim: Simulation, frame: int, precision: str = "int16") -> bytes:
+    """Pack the agent positions and exited flags of a simulation into a frame.
+
+    Args:
+        sim (Simulation): simulation to encode.
+        frame (int): index of the frame within the session.
+        precision (str): "int16" to truncate positions like `AgentDTO`, or "float32".
+
+    Returns:
+        bytes: the encoded frame.
+    """
+    state = sim.agent_state
+    flags, dtype = _flags_and_dtype(sim, precision)
+    # (row, col) -> (x, y)
+    positions = state.position[:, ::-1].astype(dtype)
+    exited = np.packbits(state.exited, bitorder="little")
+    header = FRAME_HEADER.pack(FRAME, VERSION, flags, frame, len(state))
+    return b"".join((header, positions.tobytes(), exited.tobytes()))
+
+
+def encode_delta(sim: Simulation, frame: int, indices: np.ndarray,
+                 precision: str = "int16") -> bytes:
+    """Pack the positions and exited flags of some agents into a delta frame.
+
+    Args:
+        sim (Simulation): simulation to encode.
+        frame (int): index of the frame within the session.
+        indices (np.ndarray): agents to include, as returned by `DeltaEncoder.update`.
+        precision (str): "int16" or "float32", as for `encode_frame`.
+
+    Returns:
+        bytes: the encoded frame.
+    """
+    state = sim.agent_state
+    flags, dtype = _flags_and_dtype(sim, precision)
+    positions = state.position[indices][:, ::-1].astype(dtype)
+    exited = np.packbits(state.exited[indices], bitorder="little")
+    header = FRAME_HEADER.pack(DELTA, VERSION, flags, frame, len(indices))
+    return b"".join((header, indices.astype("<u4").tobytes(), positions.tobytes(),
+                     exited.tobytes()))
+
+
+def encode_path_image(sim: Simulation, fmt: str = "rgb") -> bytes:
+    """Pack the path image of a simulation into a `PATH_IMAGE` message.
+
+    Args:
+        sim (Simulation): simulation whose path field to encode.
+        fmt (str): "rgb" for raw RGB bytes or "png".
+
+    Returns:
+        bytes: the encoded message.
+    """
+    rgb = sim.path_colors()
+    rows, cols, _ = rgb.shape
+    if fmt == "png":
+        header = FRAME_HEADER.pack(PATH_IMAGE, VERSION, FLAG_PNG, rows, cols)
+        return header + _png(rgb)
+    header = FRAME_HEADER.pack(PATH_IMAGE, VERSION, 0, rows, cols)
+    return header + rgb.tobytes()
+
+
+def _png(rgb: np.ndarray) -> bytes:
+    """Minimal 8-bit RGB PNG encoder."""
+    rows, cols, _ = rgb.shape
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    # every scanline starts with filter type 0 (none)
+    scanlines = np.hstack([np.zeros((rows, 1), dtype=np.uint8), rgb.reshape(rows, -1)])
+    return b"".join((
+        b"\x89PNG\r\n\x1a\n",
+        chunk(b"IHDR", struct.pack(">IIBBBBB", cols, rows, 8, 2, 0, 0, 0)),
+        chunk(b"IDAT", zlib.compress(scanlines.tobytes())),
+        chunk(b"IEND", b""),
+    ))
+
+
+def decode_frame(data: bytes) -> dict:
+    """Unpack a frame produced by `encode_frame` or `encode_delta`.
+
+    Mirrors the client decoder.
+
+    Args:
+        data (bytes): the encoded frame.
+
+    Returns:
+        dict: message type, frame index, running flag, indices of the agents carried
+            (None for a full frame), their positions (n, 2) as (x, y) and exited flags.
+    """
+    kind, version, flags, frame, n = FRAME_HEADER.unpack_from(data)
+    assert kind in (FRAME, DELTA) and version == VERSION
+    dtype = np.dtype("<f4") if flags & FLAG_FLOAT32 else np.dtype("<i2")
+    offset = FRAME_HEADER.size
+    indices = None
+    if kind == DELTA:
+        indices = np.frombuffer(data, dtype="<u4", count=n, offset=offset)
+        offset += indices.nbytes
+    positions = np.frombuffer(data, dtype=dtype, count=2 * n, offset=offset).reshape(n, 2)
+    offset += positions.nbytes
+    exited = np.unpackbits(np.frombuffer(data, dtype=np.uint8, offset=offset),
+                           count=n, bitorder="little").astype(bool)
+    return {
+        "type": kind,
+        "frame": frame,
+        "indices": indices,
+        "state": bool(flags & FLAG_RUNNING),
+        "positions": positions,
+        "exited": exited,
+    }
@@ -0,0 +1,263 @@
+"""Checkpoints and step recordings of simulations, and their replay.
+
+A checkpoint is a single `.npz` file holding everything `Simulation.restore`
+needs, including the RNG state and the static fields.
+
+A recording is a directory of columnar chunks:
+
+    meta.json          settings, layout and the number of frames written so far
+    checkpoint.npz     the simulation when recording started
+    00000.npz          frames 0 .. chunk_size - 1, compressed
+    00001/position.npy ... or uncompressed, one memory-mappable file per column
+
+Every chunk holds the columns `step`, `time`, `position`, `v_t` and `exited`, one
+row per recorded frame. `meta.json` is rewritten after every chunk, so a recording
+cut short stays readable up to its last complete chunk.
+"""
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+from app.models.field_cache import FieldCache, field_cache as shared_field_cache
+from app.models.scenario import Scenario
+from app.models.sim import Agent, Obstacle, Simulation
+from app.models.state import AgentState
+
+# directory the websocket endpoint saves and loads checkpoints and recordings in
+SIM_RECORDING_DIR = Path(os.environ.get("SIM_RECORDING_DIR",
+                                        Path(__file__).resolve().parents[1] / "recordings"))
+
+VERSION = 1
+DEFAULT_CHUNK_SIZE = 256
+COLUMNS = ("step", "time", "position", "v_t", "exited")
+
+
+def resolve(name: str, suffix: str = "") -> Path:
+    """Path of the checkpoint or recording `name` in `SIM_RECORDING_DIR`."""
+    if not re.fullmatch(r"[\w-]+", name):
+        raise ValueError(f"Invalid recording name: {name}")
+    return SIM_RECORDING_DIR / f"{name}{suffix}"
+
+
+def save_checkpoint(sim: Simulation, path: str | Path):
+    """Write a checkpoint of `sim` to a compressed `.npz` file."""
+    meta, arrays = sim.checkpoint()
+    meta["version"] = VERSION
+    np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+
+
+def load_checkpoint(path: str | Path,
+                    field_cache: FieldCache | None = shared_field_cache) -> Simulation:
+    """Restore a simulation from a checkpoint written by `save_checkpoint`.
+
+    Raises:
+        ValueError: if the file is not a checkpoint of this version.
+    """
+    with np.load(path) as data:
+        if "meta" not in data:
+            raise ValueError(f"{path} is not a checkpoint")
+        meta = json.loads(str(data["meta"]))
+        if meta.get("version") != VERSION:
+            raise ValueError(f"Unsupported checkpoint version: {meta.get('version')}")
+        arrays = {name: data[name] for name in data.files if name != "meta"}
+    return Simulation.restore(meta, arrays, field_cache)
+
+
+class Recorder:
+    """Appends the agent state of a simulation to a recording.
+
+    Attach it as `sim.recorder` to record every `every`-th step, or call `record`
+    directly.
+    """
+
+    def __init__(self, path: str | Path, sim: Simulation, every: int = 1,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, compress: bool = True):
+        """Start a recording of `sim` at `path`, which must not exist yet.
+
+        Args:
+            path (str | Path): directory of the recording.
+            sim (Simulation): simulation to record; its current state is frame 0.
+            every (int): record every n-th step.
+            chunk_size (int): frames per chunk.
+            compress (bool): write compressed `.npz` chunks instead of
+                memory-mappable `.npy` columns.
+        """
+        if every < 1 or chunk_size < 1:
+            raise ValueError("every and chunk_size must be positive")
+        self.path = Path(path)
+        self.every = every
+        self.chunk_size = chunk_size
+        self.compress = compress
+        self.frames = 0
+        self.chunks = 0
+        self._steps = 0
+        self._buffer = {column: [] for column in COLUMNS}
+
+        self.path.mkdir(parents=True)
+        save_checkpoint(sim, self.path / "checkpoint.npz")
+        self.meta = {
+            "version": VERSION,
+            "num_agents": len(sim.agent_state),
+            "dt": sim.dt,
+            "every": every,
+            "chunk_size": chunk_size,
+            "compressed": compress,
+            "scenario": sim.scenario.to_dict(),
+            "obstacles": [(o.x0, o.y0, o.size[0], o.size[1]) for o in sim.obstacles],
+        }
+        self._append(sim)
+
+    def record(self, sim: Simulation):
+        """Count a step of `sim` and append its state if it is due."""
+        self._steps += 1
+        if self._steps % self.every == 0 or sim.finished:
+            self._append(sim)
+
+    def _append(self, sim: Simulation):
+        state = sim.agent_state
+        self._buffer["step"].append(self._steps)
+        self._buffer["time"].append(sim.time)
+        self._buffer["position"].append(state.position.astype(np.float32))
+        self._buffer["v_t"].append(state.v_t.astype(np.float32))
+        self._buffer["exited"].append(state.exited.copy())
+        if len(self._buffer["step"]) == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered frames as a chunk and update `meta.json`."""
+        if not self._buffer["step"]:
+            return
+        columns = {column: np.stack(values) for column, values in self._buffer.items()}
+        name = f"{self.chunks:05d}"
+        if self.compress:
+            np.savez_compressed(self.path / f"{name}.npz", **columns)
+        else:
+            (self.path / name).mkdir()
+            for column, values in columns.items():
+                np.save(self.path / name / f"{column}.npy", values)
+        self.chunks += 1
+        self.frames += len(columns["step"])
+        self._buffer = {column: [] for column in COLUMNS}
+        with open(self.path / "meta.json", "w") as f:
+            json.dump(dict(self.meta, frames=self.frames, chunks=self.chunks), f)
+
+    def close(self):
+        self.flush()
+
+
+class Recording:
+    """Random access to the frames of a recording."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        try:
+            with open(self.path / "meta.json") as f:
+                self.meta = json.load(f)
+        except FileNotFoundError:
+            raise ValueError(f"No recording at {self.path}") from None
+        if self.meta.get("version") != VERSION:
+            raise ValueError(f"Unsupported recording version: {self.meta.get('version')}")
+        self.chunk_size = self.meta["chunk_size"]
+        self._cached = (None, None)
+
+    def __len__(self) -> int:
+        return self.meta["frames"]
+
+    def chunk(self, index: int) -> dict[str, np.ndarray]:
+        """Columns of one chunk; uncompressed chunks are memory-mapped."""
+        if self._cached[0] == index:
+            return self._cached[1]
+        name = f"{index:05d}"
+        if self.meta["compressed"]:
+            with np.load(self.path / f"{name}.npz") as data:
+                columns = {column: data[column] for column in COLUMNS}
+        else:
+            columns = {column: np.load(self.path / name / f"{column}.npy", mmap_mode="r")
+                       for column in COLUMNS}
+        self._cached = (index, columns)
+        return columns
+
+    def frame(self, index: int) -> dict[str, np.ndarray]:
+        """One row of every column."""
+        if not 0 <= index < len(self):
+            raise IndexError(f"Frame {index} out of range for {len(self)} frames")
+        columns = self.chunk(index // self.chunk_size)
+        return {column: values[index % self.chunk_size] for column, values in columns.items()}
+
+    def checkpoint(self, field_cache: FieldCache | None = shared_field_cache) -> Simulation:
+        """The simulation as it was when recording started."""
+        return load_checkpoint(self.path / "checkpoint.npz", field_cache)
+
+
+class Replay:
+    """Plays a recording back as if it were a running `Simulation`.
+
+    It has what the frame encoders and `SimulationRunner` use: `agent_state`,
+    `agents`, `active`, `obstacles`, `state`, `finished` and `step`, which moves
+    to the next frame.
+    """
+
+    def __init__(self, recording: Recording):
+        self.recording = recording
+        meta = recording.meta
+        self.scenario = Scenario.from_dict(meta["scenario"])
+        self.obstacles = [Obstacle(size=(w, h), position=(x, y))
+                          for x, y, w, h in meta["obstacles"]]
+        self.agent_state = AgentState(meta["num_agents"])
+        self.agents = [Agent.view(self.agent_state, i) for i in range(meta["num_agents"])]
+        self.active = np.zeros(0, dtype=np.intp)
+        self.time = 0.0
+        self.cursor = 0
+        self._simulation = None
+        self.seek(0)
+
+    @property
+    def state(self) -> bool:
+        return not self.finished
+
+    @property
+    def finished(self) -> bool:
+        return self.cursor >= len(self.recording) - 1
+
+    def seek(self, frame: int):
+        """Show `frame`, clamped to the recording."""
+        self.cursor = min(max(int(frame), 0), len(self.recording) - 1)
+        row = self.recording.frame(self.cursor)
+        state = self.agent_state
+        state.position[:] = row["position"]
+        state.grid_position[:] = row["position"] // self.scenario.grid_size
+        state.v_t[:] = row["v_t"]
+        state.exited[:] = row["exited"]
+        self.time = float(row["time"])
+        self.active = np.flatnonzero(~state.exited)
+
+    def step(self):
+        self.seek(self.cursor + 1)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the replay and its decompressed chunk [byte]."""
+        arrays = list(vars(self.agent_state).values())
+        _, columns = self.recording._cached
+        if columns is not None and not self.recording.meta["compressed"]:
+            columns = None  # memory-mapped
+        arrays += list(columns.values()) if columns is not None else []
+        if self._simulation is not None:
+            return sum(array.nbytes for array in arrays) + self._simulation.nbytes
+        return sum(array.nbytes for array in arrays)
+
+    @property
+    def simulation(self) -> Simulation:
+        """The recorded simulation at its start, restored on first use."""
+        if self._simulation is None:
+            self._simulation = self.recording.checkpoint()
+        return self._simulation
+
+    def path_colors(self) -> np.ndarray:
+        return self.simulation.path_colors()
+
+    def get_path_image(self) -> list[str]:
+        return self.simulation.get_path_image()
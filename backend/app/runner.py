@@ -0,0 +1,157 @@
+"""Server-driven run loop streaming simulation frames to a websocket."""
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from app.models.profiling import NULL_PROFILER, Profiler
+from app.models.sim import Simulation
+from app.workers import SessionWorker
+
+logger = logging.getLogger("uvicorn")
+
+DEFAULT_SUBSTEPS = 10
+DEFAULT_FPS = 30
+
+
+def _number(kind: type, name: str, value: Any) -> int | float:
+    """Coerce a client-supplied rate to `kind`, raising ValueError on bad input."""
+    if isinstance(value, bool):
+        raise ValueError(f"{name} must be a number, got {value!r}")
+    try:
+        return kind(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{name} must be a number, got {value!r}") from None
+
+
+class SimulationRunner:
+    """Advances a simulation on its own and pushes frames at a target rate.
+
+    Stepping and sending run as two tasks joined by a single-slot mailbox: the
+    stepping task always overwrites the slot with the newest frame, and the sending
+    task forwards whatever is in it once the previous send has completed. A slow
+    socket therefore makes frames coalesce (counted in `frames_dropped`) instead of
+    queueing up or slowing the simulation down.
+    """
+
+    def __init__(self, sim: Simulation,
+                 encode: Callable[[], Any],
+                 send: Callable[[Any], Awaitable[None]],
+                 substeps: int = DEFAULT_SUBSTEPS,
+                 fps: float = DEFAULT_FPS,
+                 worker: SessionWorker | None = None,
+                 profiler: Profiler = NULL_PROFILER,
+                 on_drop: Callable[[], None] | None = None):
+        """Initialize a runner.
+
+        Args:
+            sim (Simulation): simulation to drive.
+            encode (Callable[[], Any]): builds a frame from the current state.
+            send (Callable[[Any], Awaitable[None]]): sends one frame to the client.
+            substeps (int): physics steps per emitted frame.
+            fps (float): target frames per second.
+            worker (SessionWorker | None): runs the substeps and encoding off the
+                event loop; without one they run on the loop itself.
+            profiler (Profiler): times the steps and counts dropped frames.
+            on_drop (Callable[[], None] | None): called whenever a frame is dropped,
+                e.g. to resynchronize a client that only receives changes.
+        """
+        self.sim = sim
+        self.encode = encode
+        self.send = send
+        self.worker = worker
+        self.profiler = profiler
+        self.on_drop = on_drop
+        self.substeps = DEFAULT_SUBSTEPS
+        self.fps = DEFAULT_FPS
+        self.set_rate(substeps, fps)
+
+        self.frames_sent = 0
+        self.frames_dropped = 0
+
+        self._pending = None
+        self._frame_ready = asyncio.Event()
+        self._running = asyncio.Event()
+        self._running.set()
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def paused(self) -> bool:
+        return not self._running.is_set()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._produce()),
+                       asyncio.create_task(self._consume())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def set_rate(self, substeps: int | None = None, fps: float | None = None):
+        """Change the number of substeps per frame and/or the target frame rate.
+
+        Raises:
+            ValueError: if either is not a positive number.
+        """
+        if substeps is not None:
+            substeps = _number(int, "substeps", substeps)
+            if substeps < 1:
+                raise ValueError(f"substeps must be positive, got {substeps}")
+        if fps is not None:
+            fps = _number(float, "fps", fps)
+            if not fps > 0 or fps == float("inf"):
+                raise ValueError(f"fps must be positive, got {fps}")
+        if substeps is not None:
+            self.substeps = substeps
+        if fps is not None:
+            self.fps = fps
+
+    async def advance(self) -> Any:
+        """Run one frame worth of substeps and return the encoded frame."""
+        if self.worker is not None:
+            return await self.worker.run(self._advance)
+        for _ in range(self.substeps):
+            with self.profiler.stage("step"):
+                self.sim.step()
+            # let other connections run between substeps
+            await asyncio.sleep(0)
+        return self.encode()
+
+    def _advance(self) -> Any:
+        for _ in range(self.substeps):
+            with self.profiler.stage("step"):
+                self.sim.step()
+        return self.encode()
+
+    async def _produce(self):
+        loop = asyncio.get_running_loop()
+        next_frame = loop.time()
+        while not self.sim.finished:
+            await self._running.wait()
+            frame = await self.advance()
+            if self._pending is not None:
+                self.frames_dropped += 1
+                self.profiler.frames_dropped += 1
+                if self.on_drop is not None:
+                    self.on_drop()
+            self._pending = frame
+            self._frame_ready.set()
+
+            next_frame = max(next_frame + 1 / self.fps, loop.time())
+            await asyncio.sleep(next_frame - loop.time())
+
+    async def _consume(self):
+        while True:
+            await self._frame_ready.wait()
+            self._frame_ready.clear()
+            payload, self._pending = self._pending, None
+            await self.send(payload)
+            self.frames_sent += 1
@@ -0,0 +1,240 @@
+"""Websocket sessions that outlive their connection.
+
+Every `/ws` connection belongs to a session, identified by an unguessable token
+that is sent to the client with its `simulation_state`. When the connection drops,
+the session is only detached: reconnecting with `/ws?session=<token>` within
+`SIM_SESSION_IDLE` seconds picks the simulation up where it was.
+
+Detached sessions are evicted, least recently used first, once they have been
+idle for too long, when a new session needs room under `SIM_MAX_SESSIONS`, or
+when a new simulation would exceed `SIM_MEMORY_BUDGET`. With `SIM_SESSION_SPILL`
+set, an evicted simulation is checkpointed to disk first and can still be resumed
+later. Connected sessions are never evicted; once they alone fill the limits, new
+sessions and simulations are refused with an `AdmissionError`.
+"""
+import asyncio
+import logging
+import os
+import secrets
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from fastapi import WebSocket
+
+from app import metrics, recording
+from app.models.profiling import Profiler
+from app.models.sim import Simulation
+
+logger = logging.getLogger("uvicorn")
+
+SIM_MAX_SESSIONS = int(os.environ.get("SIM_MAX_SESSIONS", 64))
+SIM_MEMORY_BUDGET = int(os.environ.get("SIM_MEMORY_BUDGET", 1 << 30))  # [byte]
+SIM_SESSION_IDLE = float(os.environ.get("SIM_SESSION_IDLE", 300))  # [second]
+SIM_SESSION_SPILL = os.environ.get("SIM_SESSION_SPILL", "").lower() in ("1", "true", "yes")
+# spilled checkpoints older than this are deleted [second]
+SPILL_TTL = 24 * 3600
+
+# websocket close code asking the client to retry later
+TRY_AGAIN_LATER = 1013
+
+
+class AdmissionError(Exception):
+    """The server is at its session or memory limit."""
+
+
+def session_nbytes(session: dict) -> int:
+    """Memory held by the simulation of a session [byte]."""
+    sim = session.get("simulation")
+    return sim.nbytes if sim is not None else 0
+
+
+class SessionManager:
+    """Sessions by token, least recently used first."""
+
+    def __init__(self, max_sessions: int = SIM_MAX_SESSIONS,
+                 memory_budget: int = SIM_MEMORY_BUDGET,
+                 idle_timeout: float = SIM_SESSION_IDLE, spill: bool = SIM_SESSION_SPILL):
+        """Initialize an empty manager.
+
+        Args:
+            max_sessions (int): sessions kept at once, connected or not.
+            memory_budget (int): bytes all simulations together may hold.
+            idle_timeout (float): seconds a detached session is kept for resumption.
+            spill (bool): checkpoint evicted simulations to disk for later resumption.
+        """
+        self.max_sessions = max_sessions
+        self.memory_budget = memory_budget
+        self.idle_timeout = idle_timeout
+        self.spill = spill
+        self.sessions: OrderedDict[str, dict] = OrderedDict()
+        # spilled sessions: token -> (checkpoint path, stream options)
+        self.spilled: dict[str, tuple[Path, dict]] = {}
+        self.evictions = 0
+        self.rejections = 0
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    @property
+    def spill_dir(self) -> Path:
+        return recording.SIM_RECORDING_DIR / "sessions"
+
+    async def attach(self, websocket: WebSocket,
+                     token: str | None = None) -> tuple[str, dict, bool]:
+        """Connect a websocket to the session `token`, or to a new session.
+
+        A session still connected elsewhere is taken over; the older connection is
+        closed.
+
+        Returns:
+            tuple[str, dict, bool]: the token, the session and whether it was resumed.
+
+        Raises:
+            AdmissionError: if a new session is needed but the server is full.
+        """
+        self.sweep()
+        session = self.sessions.get(token) if token else None
+        if session is not None:
+            old = session.get("websocket")
+            await stop_runner(session)
+            if old is not None and old is not websocket:
+                try:
+                    await old.close()
+                except RuntimeError:
+                    pass
+        elif token in self.spilled:
+            self._make_room()
+            path, options = self.spilled[token]
+            loop = asyncio.get_running_loop()
+            sim = await loop.run_in_executor(None, recording.load_checkpoint, path)
+            session = self._new_session(token)
+            try:
+                self.reserve(token, sim)
+            except AdmissionError:
+                del self.sessions[token]
+                raise
+            del self.spilled[token]
+            path.unlink(missing_ok=True)
+            session.update(options, simulation=sim, frame=0)
+            sim.profiler = session["profiler"]
+        if session is not None:
+            session["websocket"] = websocket
+            if session.get("delta") is not None:
+                session["delta"].force_keyframe = True
+            self.touch(token)
+            return token, session, True
+
+        self._make_room()
+        token = secrets.token_urlsafe(16)
+        session = self._new_session(token)
+        session["websocket"] = websocket
+        return token, session, False
+
+    def _make_room(self):
+        """Evict detached sessions until one more fits under `max_sessions`."""
+        while len(self.sessions) >= self.max_sessions:
+            if not self._evict_one():
+                self.rejections += 1
+                raise AdmissionError(f"Server is at its limit of {self.max_sessions} "
+                                     "sessions, try again later")
+
+    def _new_session(self, token: str) -> dict:
+        session = self.sessions[token] = {
+            "token": token,
+            "websocket": None,
+            "profiler": Profiler(enabled=metrics.SIM_METRICS),
+            "last_seen": time.monotonic(),
+        }
+        return session
+
+    async def detach(self, token: str, websocket: WebSocket):
+        """Mark a session as disconnected, unless another connection took it over."""
+        session = self.sessions.get(token)
+        if session is None or session.get("websocket") is not websocket:
+            return
+        await stop_runner(session)
+        session["websocket"] = None
+        session["last_seen"] = time.monotonic()
+        if self.idle_timeout <= 0:
+            self.evict(token)
+
+    def touch(self, token: str):
+        """Mark a session as just used."""
+        self.sessions.move_to_end(token)
+        self.sessions[token]["last_seen"] = time.monotonic()
+
+    def reserve(self, token: str, sim: Simulation):
+        """Make room for `sim` to replace the simulation of session `token`.
+
+        Raises:
+            AdmissionError: if it does not fit in the memory budget even after
+                evicting every detached session.
+        """
+        needed = sim.nbytes
+        while self.nbytes() - session_nbytes(self.sessions[token]) + needed > \
+                self.memory_budget:
+            if not self._evict_one(exclude=token):
+                self.rejections += 1
+                raise AdmissionError("Server memory budget exceeded, try a smaller "
+                                     "simulation or again later")
+
+    def nbytes(self) -> int:
+        return sum(session_nbytes(session) for session in self.sessions.values())
+
+    def _evict_one(self, exclude: str | None = None) -> bool:
+        """Evict the least recently used detached session; False if there is none."""
+        for token, session in self.sessions.items():
+            if session.get("websocket") is None and token != exclude:
+                self.evict(token)
+                return True
+        return False
+
+    def evict(self, token: str):
+        """Drop a detached session, spilling its simulation to disk if enabled."""
+        session = self.sessions.pop(token)
+        self.evictions += 1
+        sim = session.get("simulation")
+        if getattr(sim, "recorder", None) is not None:
+            sim.recorder.close()
+            sim.recorder = None
+        if self.spill and isinstance(sim, Simulation):
+            path = self.spill_dir / f"{token}.npz"
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                recording.save_checkpoint(sim, path)
+            except OSError:
+                logger.exception("could not spill session %s", token)
+                return
+            options = {key: session[key] for key in
+                       ("protocol", "precision", "delta", "attach_metrics")
+                       if key in session}
+            self.spilled[token] = (path, options)
+
+    def sweep(self):
+        """Evict detached sessions idle for longer than `idle_timeout`."""
+        now = time.monotonic()
+        for token, session in list(self.sessions.items()):
+            if session.get("websocket") is None and \
+                    now - session["last_seen"] > self.idle_timeout:
+                self.evict(token)
+        for token, (path, _) in list(self.spilled.items()):
+            try:
+                expired = time.time() - path.stat().st_mtime > SPILL_TTL
+            except OSError:
+                expired = True
+            if expired:
+                path.unlink(missing_ok=True)
+                del self.spilled[token]
+
+    async def run_sweeper(self, interval: float = 30):
+        """Sweep periodically; run as a background task for the server's lifetime."""
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+
+
+async def stop_runner(session: dict):
+    runner = session.pop("runner", None)
+    if runner is not None:
+        await runner.stop()
@@ -0,0 +1,34 @@
+import numpy as np
+from app.batch import COLUMNS, expand_spec, run, run_sweep, write_results
+from app.models.sim import RANDOM_SEED
+
+
+def test_expand_spec():
+    runs = expand_spec({"seeds": 3, "num_agents": [5, 10], "num_obstacles": 1,
+                        "max_steps": 50})
+    assert len(runs) == 6
+    assert {r["seed"] for r in runs} == {RANDOM_SEED, RANDOM_SEED + 1, RANDOM_SEED + 2}
+    assert all(r["max_steps"] == 50 and r["num_obstacles"] == 1 for r in runs)
+
+
+def test_runs_are_reproducible_per_seed():
+    a = run(seed=3, num_agents=8, num_obstacles=1, max_steps=30, backend="numpy")
+    b = run(seed=3, num_agents=8, num_obstacles=1, max_steps=30, backend="numpy")
+    for column in ("steps", "exited", "evacuation_time", "exit_throughput"):
+        assert a[column] == b[column] or (np.isnan(a[column]) and np.isnan(b[column]))
+
+
+def test_sweep_writes_columns(tmp_path):
+    results = run_sweep({"seeds": [1, 2], "num_agents": 4, "max_steps": 5,
+                         "backend": "numpy"}, workers=2)
+    path = str(tmp_path / "results.npz")
+    write_results(results, path)
+    columns = np.load(path)
+    assert set(columns.files) == set(COLUMNS)
+    np.testing.assert_array_equal(columns["seed"], [1, 2])
+    np.testing.assert_array_equal(columns["steps"], [5, 5])
+
+
+def test_run_without_obstacles():
+    result = run(seed=1, num_agents=6, num_obstacles=0, max_steps=20, backend="numpy")
+    assert result["num_obstacles"] == 0 and result["steps"] == 20
@@ -0,0 +1,46 @@
+import random
+
+import numpy as np
+import pytest
+from app.models.field_cache import FieldCache
+from app.models.sim import Simulation
+
+
+def test_same_layout_shares_fields():
+    cache = FieldCache()
+    random.seed(7)
+    sim_a = Simulation(10, 2, True, field_cache=cache)
+    random.seed(7)
+    sim_b = Simulation(20, 2, True, field_cache=cache)
+    # fields are built lazily, one cache entry per group
+    assert cache.stats()["misses"] == 0
+    sim_a.build_fields()
+    sim_b.build_fields()
+    groups = len(Simulation.FIELD_GROUPS)
+    assert cache.stats()["misses"] == groups and cache.stats()["hits"] == groups
+    assert sim_a.wall_distance_grid is sim_b.wall_distance_grid
+    assert sim_a.obstacle_direction_grid is sim_b.obstacle_direction_grid
+    assert sim_a.path_dir_grid is sim_b.path_dir_grid
+    with pytest.raises(ValueError):
+        sim_a.path_dir_grid[0, 0, 0] = 1
+
+    random.seed(7)
+    uncached = Simulation(10, 2, True, field_cache=None)
+    assert uncached.wall_distance_grid is not sim_a.wall_distance_grid
+    np.testing.assert_array_equal(uncached.wall_distance_grid, sim_a.wall_distance_grid)
+    assert cache.stats()["misses"] == groups and cache.stats()["hits"] == groups
+
+
+def test_lru_eviction_respects_budget():
+    cache = FieldCache(max_bytes=3 * 800)
+    build = lambda: {"field": np.zeros(100)}  # 800 bytes
+    for key in "abc":
+        cache.get_or_build(key, build)
+    cache.get_or_build("a", build)  # a is now the most recently used
+    cache.get_or_build("d", build)
+    assert cache.nbytes <= cache.max_bytes
+    assert cache.get_or_build("a", build) is not None
+    assert cache.stats()["hits"] == 2
+    misses = cache.misses
+    cache.get_or_build("b", build)  # b was evicted
+    assert cache.misses == misses + 1
@@ -0,0 +1,44 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.profiling import Profiler
+from app.models.sim import Simulation
+
+
+def test_profiler_records_step_stages_only_when_enabled():
+    sim = Simulation(10, 1, True, backend="numpy", seed=0)
+    sim.profiler = Profiler(enabled=False)
+    sim.step()
+    assert sim.profiler.stages == {}
+
+    sim.profiler = Profiler()
+    for _ in range(3):
+        sim.step()
+    stages = sim.profiler.stages
+    assert set(stages) == {"cell_list", "desired_force", "neighbor_force", "wall_force",
+                           "integrate"}
+    assert all(h.count == 3 and h.buckets.sum() == 3 for h in stages.values())
+    summary = sim.profiler.summary()["stages"]["neighbor_force"]
+    assert 0 < summary["p50"] <= summary["p99"]
+
+
+def test_metrics_endpoint_and_attached_metrics():
+    client = TestClient(app)
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({
+            "type": "init",
+            "data": {"numAgents": 5, "numObstacles": 1, "state": True},
+            "metrics": True,
+        })
+        websocket.receive_json()
+        websocket.send_json({"type": "step"})
+        frame = websocket.receive_json()
+        assert frame["metrics"]["stages"]["step"]["count"] == 1
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        body = response.text
+        assert "sim_active_connections 1" in body
+        assert 'state="active"} 5' in body
+        assert 'stage="encode",le="+Inf"} 1' in body
+        assert "sim_frames_sent_total{" in body
@@ -0,0 +1,119 @@
+import random
+import zlib
+
+import numpy as np
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models.sim import Simulation
+from app.protocol import (FRAME_HEADER, PATH_IMAGE, DeltaEncoder, decode_frame, encode_delta,
+                          encode_frame, encode_path_image)
+
+
+def test_frame_round_trip():
+    random.seed(0)
+    sim = Simulation(21, 1, True)
+    sim.step()
+    sim.agent_state.exited[[0, 9, 20]] = True
+
+    frame = decode_frame(encode_frame(sim, 7))
+    assert frame["frame"] == 7
+    assert frame["state"] is True
+    expected = [(agent.position[1], agent.position[0]) for agent in sim.agents]
+    np.testing.assert_array_equal(frame["positions"], np.array(expected).astype(np.int16))
+    np.testing.assert_array_equal(frame["exited"], [agent.exited for agent in sim.agents])
+
+    frame = decode_frame(encode_frame(sim, 8, precision="float32"))
+    np.testing.assert_allclose(frame["positions"], expected, rtol=1e-6)
+
+
+def test_websocket_binary_protocol():
+    client = TestClient(app)
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({
+            "type": "init",
+            "data": {"numAgents": 5, "numObstacles": 1, "state": True},
+            "protocol": "binary",
+        })
+        init = websocket.receive_json()
+        assert init["type"] == "simulation_state"
+        assert len(init["data"]["agents"]) == 5
+
+        websocket.send_json({"type": "step"})
+        frame = decode_frame(websocket.receive_bytes())
+        assert frame["frame"] == 1
+        assert frame["positions"].shape == (5, 2)
+
+
+def test_delta_frames_reconstruct_full_frames():
+    random.seed(4)
+    sim = Simulation(30, 1, True)
+    sim.agent_state.v_t[:10] = 200.0
+    delta = DeltaEncoder(keyframe_interval=25)
+    client_positions = client_exited = None
+    sizes = []
+    for frame in range(1, 60):
+        sim.step()
+        if frame == 40:
+            sim.agent_state.exited[:3] = True
+        indices = delta.update(sim)
+        if indices is None:
+            decoded = decode_frame(encode_frame(sim, frame))
+            assert frame in (1, 26, 51)
+            client_positions = decoded["positions"].copy()
+            client_exited = decoded["exited"].copy()
+        else:
+            data = encode_delta(sim, frame, indices)
+            sizes.append(len(data))
+            decoded = decode_frame(data)
+            client_positions[decoded["indices"]] = decoded["positions"]
+            client_exited[decoded["indices"]] = decoded["exited"]
+            if frame > 40:
+                # exited agents are sent once
+                assert not set(decoded["indices"].tolist()) & {0, 1, 2}
+        full = decode_frame(encode_frame(sim, frame))
+        np.testing.assert_array_equal(client_positions[~full["exited"]],
+                                      full["positions"][~full["exited"]])
+        np.testing.assert_array_equal(client_exited, full["exited"])
+    assert min(sizes) < len(encode_frame(sim, 0))
+
+
+def test_path_image_formats():
+    random.seed(6)
+    sim = Simulation(5, 2, True)
+    colors = sim.get_path_image()
+    assert sim.get_path_image() is colors
+    assert len(colors) == sim.grid.size
+
+    data = encode_path_image(sim, "rgb")
+    kind, _, flags, rows, cols = FRAME_HEADER.unpack_from(data)
+    assert (kind, flags, rows, cols) == (PATH_IMAGE, 0, *sim.grid.shape)
+    rgb = np.frombuffer(data, dtype=np.uint8, offset=FRAME_HEADER.size).reshape(-1, 3)
+    assert [f"#{r:02x}{g:02x}{b:02x}" for r, g, b in rgb] == colors
+
+    png = encode_path_image(sim, "png")[FRAME_HEADER.size:]
+    assert png.startswith(b"\x89PNG\r\n\x1a\n")
+    # IDAT holds the filtered scanlines
+    idat = png.index(b"IDAT")
+    length = int.from_bytes(png[idat - 4:idat], "big")
+    raw = np.frombuffer(zlib.decompress(png[idat + 4:idat + 4 + length]), dtype=np.uint8)
+    np.testing.assert_array_equal(raw.reshape(rows, -1)[:, 1:].reshape(-1, 3), rgb)
+
+
+def test_init_rejects_bad_stream_options():
+    client = TestClient(app)
+    with client.websocket_connect("/ws") as websocket:
+        for options in ({"precision": "float16"},
+                        {"delta": True, "keyframe_interval": "often"},
+                        {"delta": True, "keyframe_interval": 0}):
+            websocket.send_json({
+                "type": "init",
+                "data": {"numAgents": 5, "numObstacles": 1, "state": True},
+                **options,
+            })
+            assert websocket.receive_json()["type"] == "error"
+        # the connection survives
+        websocket.send_json({
+            "type": "init",
+            "data": {"numAgents": 5, "numObstacles": 1, "state": True},
+        })
+        assert websocket.receive_json()["type"] == "simulation_state"
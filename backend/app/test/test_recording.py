@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app import recording
+from app.main import app
+from app.models.sim import Simulation
+from app.protocol import decode_frame
+from app.recording import Recorder, Recording, Replay, load_checkpoint, save_checkpoint
+
+
+def test_checkpoint_resumes_exactly(tmp_path):
+    sim = Simulation(60, 2, True, backend="numpy", seed=4, integrator="verlet", dt=0.01)
+    for _ in range(20):
+        sim.step()
+    path = tmp_path / "sim.npz"
+    save_checkpoint(sim, path)
+    restored = load_checkpoint(path, field_cache=None)
+
+    assert restored.rng.getstate() == sim.rng.getstate()
+    assert restored.time == sim.time and restored.integrator == "verlet"
+    np.testing.assert_array_equal(restored.grid, sim.grid)
+    np.testing.assert_array_equal(restored.path_dir_grid, sim.path_dir_grid)
+    assert [o.position for o in restored.obstacles] == [o.position for o in sim.obstacles]
+    for _ in range(20):
+        sim.step()
+        restored.step()
+    np.testing.assert_array_equal(restored.agent_state.position, sim.agent_state.position)
+    np.testing.assert_array_equal(restored.active, sim.active)
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_recorder_round_trip(tmp_path, compress):
+    sim = Simulation(30, 1, True, backend="numpy", seed=1)
+    recorder = sim.recorder = Recorder(tmp_path / "run", sim, every=2, chunk_size=4,
+                                       compress=compress)
+    positions = [sim.agent_state.position.copy()]
+    for step in range(1, 21):
+        sim.step()
+        if step % 2 == 0:
+            positions.append(sim.agent_state.position.copy())
+    recorder.close()
+
+    run = Recording(tmp_path / "run")
+    assert len(run) == len(positions) == 11
+    for i in (0, 5, 10):
+        frame = run.frame(i)
+        assert frame["step"] == 2 * i
+        np.testing.assert_allclose(frame["position"], positions[i], rtol=1e-6)
+    if not compress:
+        assert isinstance(run.chunk(0)["position"], np.memmap)
+    with pytest.raises(IndexError):
+        run.frame(11)
+
+    replay = Replay(run)
+    replay.seek(7)
+    np.testing.assert_allclose(replay.agent_state.position, positions[7], rtol=1e-6)
+    replay.seek(100)
+    assert replay.finished and replay.cursor == 10
+
+
+def test_replay_over_websocket(tmp_path, monkeypatch):
+    monkeypatch.setattr(recording, "SIM_RECORDING_DIR", tmp_path)
+    client = TestClient(app)
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({
+            "type": "init",
+            "data": {"numAgents": 8, "numObstacles": 1, "state": True},
+        })
+        assert websocket.receive_json()["type"] == "simulation_state"
+        websocket.send_json({"type": "record", "name": "run", "every": 1})
+        assert websocket.receive_json() == {"type": "record", "data": {"name": "run"}}
+        for _ in range(5):
+            websocket.send_json({"type": "step"})
+            websocket.receive_json()
+        websocket.send_json({"type": "stop_recording"})
+        assert websocket.receive_json()["data"] == {"name": "run", "frames": 6}
+        websocket.send_json({"type": "checkpoint", "name": "saved"})
+        assert websocket.receive_json()["type"] == "checkpoint"
+
+        websocket.send_json({"type": "replay", "name": "run", "protocol": "binary"})
+        assert websocket.receive_json()["type"] == "simulation_state"
+        websocket.send_json({"type": "seek", "frame": 3})
+        frame = decode_frame(websocket.receive_bytes())
+        expected = Recording(tmp_path / "run").frame(3)["position"]
+        np.testing.assert_array_equal(frame["positions"],
+                                      expected[:, ::-1].astype(np.int16))
+
+        websocket.send_json({"type": "replay", "name": "missing"})
+        assert websocket.receive_json()["type"] == "error"
+        websocket.send_json({"type": "restore", "name": "saved"})
+        assert websocket.receive_json()["type"] == "simulation_state"
+        websocket.send_json({"type": "seek", "frame": 0})
+        assert websocket.receive_json()["type"] == "error"
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import random
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app, encode_step, resync_after_drop
+from app.models.profiling import NULL_PROFILER
+from app.models.sim import Simulation
+from app.protocol import DELTA, FRAME, DeltaEncoder, decode_frame, encode_frame
+from app.runner import SimulationRunner
+
+
+def test_runner_coalesces_frames_behind_a_slow_socket():
+    random.seed(0)
+    sim = Simulation(10, 1, True)
+    sent = []
+
+    async def slow_send(frame):
+        await asyncio.sleep(0.05)
+        sent.append(frame)
+
+    async def main():
+        counter = iter(range(1_000_000))
+        runner = SimulationRunner(sim, encode=lambda: next(counter), send=slow_send,
+                                  substeps=1, fps=500)
+        runner.start()
+        await asyncio.sleep(0.3)
+        runner.pause()
+        await asyncio.sleep(0.1)
+        produced = runner.frames_sent + runner.frames_dropped
+        await asyncio.sleep(0.1)
+        assert runner.frames_sent + runner.frames_dropped <= produced + 1
+        await runner.stop()
+        return runner
+
+    runner = asyncio.run(main())
+    assert runner.frames_dropped > 0
+    # frames are always the newest available, in order
+    assert sent == sorted(sent)
+
+
+def test_dropped_delta_frames_resync_the_client():
+    sim = Simulation(30, 1, True, backend="numpy", seed=5)
+    sim.agent_state.v_t[:] = 300.0
+    session = {"simulation": sim, "frame": 0, "protocol": "binary", "precision": "int16",
+               "delta": DeltaEncoder(keyframe_interval=1000), "profiler": NULL_PROFILER}
+    truth = {}
+    client = {}
+    sent = []
+
+    def encode():
+        frame = encode_step(session)
+        truth[session["frame"]] = decode_frame(encode_frame(sim, session["frame"]))
+        return frame
+
+    async def slow_send(data):
+        # every few frames the socket stalls for longer than a frame takes
+        await asyncio.sleep(0.02 if len(sent) % 5 == 0 else 0)
+        frame = decode_frame(data)
+        if frame["type"] == FRAME:
+            client["positions"] = frame["positions"].copy()
+            client["exited"] = frame["exited"].copy()
+        else:
+            client["positions"][frame["indices"]] = frame["positions"]
+            client["exited"][frame["indices"]] = frame["exited"]
+        sent.append((frame["frame"], frame["type"], client["positions"].copy(),
+                     client["exited"].copy()))
+
+    async def main():
+        runner = SimulationRunner(sim, encode=encode, send=slow_send, substeps=1, fps=500,
+                                  on_drop=lambda: resync_after_drop(session))
+        runner.start()
+        await asyncio.sleep(0.4)
+        await runner.stop()
+        return runner
+
+    runner = asyncio.run(main())
+    assert runner.frames_dropped > 0
+    assert any(kind == DELTA for _, kind, _, _ in sent)
+    previous = 0
+    for number, kind, positions, exited in sent:
+        if number == previous + 1 or kind == FRAME:
+            # nothing was dropped since the last frame the client saw
+            np.testing.assert_array_equal(positions, truth[number]["positions"])
+            np.testing.assert_array_equal(exited, truth[number]["exited"])
+        previous = number
+
+
+def test_websocket_run_mode():
+    client = TestClient(app)
+    with client.websocket_connect("/ws") as websocket:
+        websocket.send_json({
+            "type": "init",
+            "data": {"numAgents": 5, "numObstacles": 1, "state": True},
+            "protocol": "binary",
+        })
+        websocket.receive_json()
+        websocket.send_json({"type": "run", "substeps": 3, "fps": 100})
+        frames = [decode_frame(websocket.receive_bytes()) for _ in range(3)]
+        assert [frame["frame"] for frame in frames] == sorted(frame["frame"] for frame in frames)
+        for substeps in (0, "three"):
+            websocket.send_json({"type": "set_rate", "substeps": substeps})
+            message = websocket.receive()
+            while message.get("text") is None:
+                message = websocket.receive()
+            assert json.loads(message["text"])["type"] == "error"
+
+
+def test_set_rate_validates_client_input():
+    sim = Simulation(5, 1, True, seed=0)
+    runner = SimulationRunner(sim, encode=lambda: None, send=None)
+    runner.set_rate(substeps="3", fps="20")
+    assert runner.substeps == 3 and runner.fps == 20.0
+    for kwargs in ({"substeps": "three"}, {"substeps": None, "fps": [30]},
+                   {"fps": float("nan")}, {"substeps": True}):
+        with pytest.raises(ValueError):
+            runner.set_rate(**kwargs)
+    assert runner.substeps == 3 and runner.fps == 20.0
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models.scenario import Scenario
+from app.models.sim import Simulation
+from app.models.utils import EXIT
+
+
+def test_default_scenario_matches_the_original_world():
+    scenario = Scenario()
+    grid = scenario.grid()
+    assert grid.shape == (40, 50)
+    np.testing.assert_array_equal(np.flatnonzero(grid[:, -1] == EXIT), np.arange(14, 25))
+
+
+def test_round_trip_and_validation():
+    scenario = Scenario.named("corridor")
+    assert Scenario.from_dict(scenario.to_dict()) == scenario
+    with pytest.raises(ValueError):
+        Scenario.from_dict({"width": 505})
+    with pytest.raises(ValueError):
+        Scenario.from_dict({"exits": []})
+    with pytest.raises(ValueError):
+        Scenario.from_dict({"obstacles": [(495, 0, 10, 10)]})
+    with pytest.raises(ValueError):
+        Scenario.from_dict({"doors": []})
+    with pytest.raises(ValueError):
+        Scenario.named("../corridor")
+
+
+def test_simulation_uses_the_scenario_layout():
+    scenario = Scenario(width=300, height=200, exits=[(0, 80, 10, 40)],
+                        obstacles=[(100, 50, 30, 20)], nearest_obstacles=1)
+    sim = Simulation(20, 5, True, backend="numpy", field_cache=None, seed=0,
+                     scenario=scenario)
+    assert sim.grid.shape == (20, 30) and sim.num_obstacles == 1
+    assert (sim.grid[5:7, 10:13] == -1).all()
+    assert sim.obstacle_distance_grid.shape == (1, 20, 30)
+    # the flow leads to the exit on the left wall
+    assert sim.path_dir_grid[1, 10, 15] < 0
+    for _ in range(20):
+        sim.step()
+    position = sim.agent_state.position[sim.active]
+    assert (position >= 0).all() and (position[:, 0] <= 200).all()
+    assert (position[:, 1] <= 300).all()
+
+
+def test_init_with_scenario():
+    client = TestClient(app)
+    with client.websocket_connect("/ws") as websocket:
+        for scenario in ("missing", {"width": 505}):
+            websocket.send_json({
+                "type": "init",
+                "data": {"numAgents": 5, "numObstacles": 1, "state": True,
+                         "scenario": scenario},
+            })
+            assert websocket.receive_json()["type"] == "error"
+        websocket.send_json({
+            "type": "init",
+            "data": {"numAgents": 5, "numObstacles": 1, "state": True,
+                     "scenario": "corridor"},
+        })
+        reply = websocket.receive_json()
+        assert reply["type"] == "simulation_state"
+        assert Scenario.from_dict(reply["data"]["scenario"]) == Scenario.named("corridor")
+        assert len(reply["data"]["obstacles"]) == 3
@@ -0,0 +1,180 @@
+import random
+
+import numpy as np
+import pytest
+from app.models import engine, kernels
+from app.models.neighbors import CellList, interaction_cutoff
+from app.models.sim import A, AGENT_R, B, GRID_SIZE, HEIGHT, WIDTH, Agent, Simulation
+from app.models.utils import obstacle_rects
+
+
+def reference_step(sim, agents):
+    """Advance standalone per-agent copies with the scalar `Agent.step` path."""
+    inside = [agent for agent in agents if not agent.exited]
+    for agent in inside:
+        agent.step(inside, sim.path_dir_grid,
+                   sim.wall_distance_grid, sim.wall_direction_grid,
+                   sim.obstacle_distance_grid, sim.obstacle_direction_grid)
+        if sim.grid[agent.grid_position[0], agent.grid_position[1]] == 1:
+            agent.exited = True
+
+
+def test_vectorized_step_matches_agent_step():
+    random.seed(0)
+    sim = Simulation(60, 2, True)
+    # give everyone some initial velocity so the step moves agents
+    rng = np.random.default_rng(0)
+    sim.agent_state.v_t[:] = rng.normal(0, 10, size=(60, 2))
+
+    agents = [Agent(a.grid_position.copy(), a.position.copy()) for a in sim.agents]
+    for agent, original in zip(agents, sim.agents):
+        agent.v_t = original.v_t.copy()
+
+    sim.step()
+    reference_step(sim, agents)
+
+    np.testing.assert_allclose(sim.agent_state.position,
+                               np.array([a.position for a in agents]))
+    np.testing.assert_array_equal(sim.agent_state.grid_position,
+                                  np.array([a.grid_position for a in agents]))
+    # the reference updates agents one after another, so velocities only agree
+    # within the force contribution of already-moved neighbours
+    np.testing.assert_allclose(sim.agent_state.v_t,
+                               np.array([a.v_t for a in agents]), rtol=1e-3, atol=1e-3)
+
+
+def test_exited_agents_are_compacted_out():
+    random.seed(4)
+    sim = Simulation(60, 2, True)
+    rng = np.random.default_rng(4)
+    sim.agent_state.v_t[:] = rng.normal(0, 10, size=(60, 2))
+    sim.agent_state.exited[::3] = True
+    sim.compact()
+    assert sim.active.tolist() == [i for i in range(60) if i % 3]
+
+    agents = [Agent(a.grid_position.copy(), a.position.copy()) for a in sim.agents]
+    for agent, original in zip(agents, sim.agents):
+        agent.v_t = original.v_t.copy()
+        agent.exited = original.exited
+    exited_position = sim.agent_state.position[::3].copy()
+
+    sim.step()
+    reference_step(sim, agents)
+
+    # exited agents neither move nor push the others
+    np.testing.assert_array_equal(sim.agent_state.position[::3], exited_position)
+    np.testing.assert_allclose(sim.agent_state.position,
+                               np.array([a.position for a in agents]))
+    np.testing.assert_allclose(sim.agent_state.v_t,
+                               np.array([a.v_t for a in agents]), rtol=1e-3, atol=1e-3)
+    assert not sim.agent_state.exited[sim.active].any()
+
+
+def test_agents_are_views_over_state():
+    random.seed(1)
+    sim = Simulation(5, 1, True)
+    sim.agents[2].position = np.array([12.0, 34.0])
+    np.testing.assert_array_equal(sim.agent_state.position[2], [12.0, 34.0])
+
+    sim.agent_state.exited[3] = True
+    assert sim.agents[3].exited
+    assert len({agent.id for agent in sim.agents}) == 5
+
+
+def test_cell_list_matches_brute_force():
+    rng = np.random.default_rng(2)
+    position = rng.uniform(0, [HEIGHT, WIDTH], size=(500, 2))
+    # a tight cluster so that plenty of pairs interact
+    position[:100] = rng.normal([200, 250], 15, size=(100, 2))
+    r = np.full(500, AGENT_R)
+    targets = np.arange(0, 500, 2)
+
+    cell_list = CellList(interaction_cutoff(AGENT_R, A, B), (HEIGHT, WIDTH), GRID_SIZE)
+    cell_list.build(position)
+    i, j = cell_list.pairs(position, targets)
+
+    # every pair within the cutoff is found
+    d = np.linalg.norm(position[targets, np.newaxis] - position[np.newaxis], axis=-1)
+    expected = {(t, k) for row, t in enumerate(targets)
+                for k in np.flatnonzero(d[row] < cell_list.cutoff) if k != t}
+    assert set(zip(i.tolist(), j.tolist())) == expected
+
+    approx = engine.neighbor_force(position, r, i, j, A, B)[targets]
+    exact = engine.pair_force(position, r, targets, A, B)
+    np.testing.assert_allclose(approx, exact, atol=1e-2)
+
+
+@pytest.mark.skipif(not kernels.HAS_NUMBA, reason="numba is not installed")
+def test_numba_backend_matches_numpy():
+    random.seed(3)
+    sim_np = Simulation(200, 2, True, backend="numpy")
+    random.seed(3)
+    sim_nb = Simulation(200, 2, True, backend="numba")
+    np.testing.assert_allclose(sim_nb.obstacle_distance_grid, sim_np.obstacle_distance_grid)
+    np.testing.assert_allclose(sim_nb.obstacle_direction_grid, sim_np.obstacle_direction_grid,
+                               atol=1e-6)
+    rects = obstacle_rects(sim_np.obstacles)
+    nearest, _ = kernels.obstacle_distance_grid(rects, *sim_np.grid.shape, GRID_SIZE, 1)
+    np.testing.assert_allclose(nearest[0], sim_np.obstacle_distance_grid.min(axis=0))
+
+    for _ in range(20):
+        sim_np.step()
+        sim_nb.step()
+    np.testing.assert_allclose(sim_nb.agent_state.position, sim_np.agent_state.position,
+                               rtol=1e-6)
+    np.testing.assert_allclose(sim_nb.agent_state.v_t, sim_np.agent_state.v_t,
+                               rtol=1e-4, atol=1e-4)
+    np.testing.assert_array_equal(sim_nb.agent_state.exited, sim_np.agent_state.exited)
+
+
+def test_stable_dt_limits():
+    v_des = np.full((3, 2), 10.0)
+    v_t = np.zeros((3, 2))
+    m, tau = np.full(3, 60.0), np.array([0.5, 0.5, 0.01])
+    # free, crowded, and free but quick to relax
+    gap = np.array([np.inf, 0.0, np.inf])
+    dt = engine.stable_dt(v_t, v_des, m, tau, gap, A, B, GRID_SIZE)
+    speed = np.hypot(10, 10)
+    assert dt[0] == pytest.approx(engine.COURANT * GRID_SIZE / speed)
+    assert dt[1] == pytest.approx(engine.COURANT * abs(B) / speed)
+    assert dt[2] == pytest.approx(engine.COURANT * 2 * 0.01)
+
+
+@pytest.mark.parametrize("backend", ["numpy", "numba"])
+def test_integrators_converge(backend):
+    def run(**kwargs):
+        sim = Simulation(150, 2, True, backend=backend, seed=3, **kwargs)
+        while sim.time < 0.5 - 1e-9:
+            sim.step()
+        return sim
+
+    reference = run(integrator="semi_implicit", dt=0.0005)
+    for kwargs in ({"integrator": "verlet", "dt": 0.01},
+                   {"integrator": "verlet", "dt": 0.05, "adaptive": True}):
+        sim = run(**kwargs)
+        assert sim.time == pytest.approx(0.5)
+        np.testing.assert_array_equal(sim.agent_state.exited, reference.agent_state.exited)
+        error = np.linalg.norm(sim.agent_state.position - reference.agent_state.position,
+                               axis=1)
+        assert error.max() < 0.5 * AGENT_R
+    # adaptive steps evaluate far fewer forces than the fixed fine step
+    assert sim.evaluations < reference.evaluations / 50
+
+
+def test_adaptive_steps_substep_crowded_agents():
+    sim = Simulation(2, 0, True, backend="numpy", seed=0, integrator="verlet", dt=0.1,
+                     adaptive=True)
+    state = sim.agent_state
+    # one agent alone, one pressed against a wall
+    state.position[:] = [[200.0, 250.0], [200.0, 6.0]]
+    state.grid_position[:] = state.position // GRID_SIZE
+    sim.step()
+    assert sim.evaluations > 2
+    assert state.last_dt[0] > state.last_dt[1]
+
+
+def test_rejects_bad_integration_options():
+    with pytest.raises(ValueError):
+        Simulation(5, 1, True, integrator="rk4")
+    with pytest.raises(ValueError):
+        Simulation(5, 1, True, dt=0)
@@ -1,6 +1,7 @@
 import numpy as np
-from app.models.utils import grid_bfs
-from app.models.sim import Simulation
+from app.models.utils import (NO_WALL, distance_to_obstacle, flow_field, grid_bfs,
+                              obstacle_distance_grid, wall_distance_grid)
+from app.models.sim import Obstacle, Simulation
 
 def test_bfs_with_obstacles_and_exits():
     # Test case 1: Simple path to exit
@@ -32,3 +33,94 @@ def test_bfs_with_obstacles_and_exits():
     assert path3 is not None
     assert path3[1, 0] == (0, -1)  # Should reach any exit
 
+
+
+def test_flow_field_octile_distances():
+    # Test case 1: open grid with a single exit in the corner
+    grid = np.zeros((6, 9), dtype=np.int8)
+    grid[0, 8] = 1
+    direction, distance = flow_field(grid)
+    for i in range(6):
+        for j in range(9):
+            dy, dx = abs(i - 0), abs(j - 8)
+            assert np.isclose(distance[i, j], max(dy, dx) + (np.sqrt(2) - 1) * min(dy, dx))
+
+    # Test case 2: every direction steps onto a cell that is exactly one move closer
+    grid = np.zeros((12, 15), dtype=np.int8)
+    grid[3:9, 5] = -1
+    grid[2, 6:12] = -1
+    grid[4:8, -1] = 1
+    direction, distance = flow_field(grid)
+    for i, j in np.argwhere(grid == 0):
+        dy, dx = direction[:, i, j]
+        assert grid[i + dy, j + dx] != -1
+        step = np.sqrt(2) if dy and dx else 1
+        assert np.isclose(distance[i, j], distance[i + dy, j + dx] + step)
+    assert (direction[:, grid != 0] == -2).all()
+    np.testing.assert_array_equal(grid_bfs(grid), direction)
+
+    # Test case 3: a walled-off cell makes the field unusable
+    grid = np.array([
+        [0, -1, 1],
+        [-1, -1, 0],
+        [0, 0, 0]
+    ])
+    assert flow_field(grid) is None
+
+
+def test_obstacle_distance_grid_matches_per_cell():
+    grid = np.zeros((40, 50), dtype=np.int8)
+    obstacles = [Obstacle((70, 120), (40, 60)), Obstacle((150, 90), (300, 200))]
+    distance, direction = obstacle_distance_grid(grid, obstacles)
+    for i in range(0, 40, 3):
+        for j in range(0, 50, 3):
+            for k, obstacle in enumerate(obstacles):
+                d, vector = distance_to_obstacle(np.array([i, j]), obstacle)
+                if d <= 3:
+                    d = 5
+                assert np.isclose(distance[k, i, j], d)
+                np.testing.assert_allclose(direction[k, :, i, j], vector / d)
+
+    nearest_distance, nearest_direction = obstacle_distance_grid(grid, obstacles, nearest=1)
+    assert nearest_distance.shape == (1, 40, 50)
+    assert nearest_distance.dtype == np.float32
+    np.testing.assert_allclose(nearest_distance[0], distance.min(axis=0))
+    k = distance.argmin(axis=0)
+    np.testing.assert_allclose(nearest_direction[0],
+                               np.take_along_axis(direction, k[np.newaxis, np.newaxis], 0)[0])
+
+
+def test_obstacle_distance_grid_keeps_nearest_k():
+    grid = np.zeros((40, 50), dtype=np.int8)
+    obstacles = [Obstacle((70, 120), (40, 60)), Obstacle((150, 90), (300, 200)),
+                 Obstacle((30, 30), (200, 20)), Obstacle((40, 60), (420, 300))]
+    distance, direction = obstacle_distance_grid(grid, obstacles)
+    nearest, nearest_direction = obstacle_distance_grid(grid, obstacles, nearest=2)
+    assert nearest.shape == (2, 40, 50) and nearest_direction.shape == (2, 2, 40, 50)
+    np.testing.assert_allclose(np.sort(nearest, axis=0), np.sort(distance, axis=0)[:2])
+    # directions belong to the kept obstacles, where the nearest two are unambiguous
+    ranked = np.sort(distance, axis=0)
+    distinct = (ranked[0] < ranked[1]) & (ranked[1] < ranked[2])
+    k = np.argsort(distance, axis=0)[:2]
+    order = np.argsort(nearest, axis=0)
+    np.testing.assert_allclose(
+        np.take_along_axis(nearest_direction, order[:, np.newaxis], 0)[..., distinct],
+        np.take_along_axis(direction, k[:, np.newaxis], 0)[..., distinct], atol=1e-6)
+    # asking for more obstacles than there are keeps all of them
+    assert obstacle_distance_grid(grid, obstacles, nearest=10)[0].shape == (4, 40, 50)
+
+
+def test_wall_distance_grid_opens_walls_at_exits():
+    grid = np.zeros((40, 50), dtype=np.int8)
+    grid[14:25, -1] = 1
+    grid[0, 10:15] = 1
+    distance, direction = wall_distance_grid(grid)
+    assert distance.dtype == np.float32
+    # right wall: only the rows facing the exit
+    assert (distance[2, 14:25] == NO_WALL).all()
+    assert (distance[2, :14] < NO_WALL).all() and (distance[2, 25:] < NO_WALL).all()
+    # top wall: only the columns facing the exit
+    assert (distance[1, :, 10:15] == NO_WALL).all()
+    assert (distance[1, :, :10] < NO_WALL).all()
+    assert (distance[0] < NO_WALL).all() and (distance[3] < NO_WALL).all()
+    np.testing.assert_array_equal(direction[:, :, 7, 9], [[0, 1], [1, 0], [0, -1], [-1, 0]])
@@ -0,0 +1,33 @@
+import asyncio
+import threading
+import time
+
+from app.workers import StepPool
+
+
+def test_session_jobs_are_limited_and_sessions_run_in_parallel():
+    pool = StepPool(max_workers=4)
+    lock = threading.Lock()
+    running = {"a": 0, "b": 0}
+    peak = {"a": 0, "b": 0, "total": 0}
+
+    def job(name):
+        with lock:
+            running[name] += 1
+            peak[name] = max(peak[name], running[name])
+            peak["total"] = max(peak["total"], running["a"] + running["b"])
+        time.sleep(0.02)
+        with lock:
+            running[name] -= 1
+        return threading.current_thread().name
+
+    async def main():
+        a, b = pool.session(), pool.session()
+        return await asyncio.gather(*[a.run(job, "a") for _ in range(4)],
+                                    *[b.run(job, "b") for _ in range(4)])
+
+    threads = asyncio.run(main())
+    pool.shutdown()
+    assert all(name.startswith("sim-worker") for name in threads)
+    assert peak["a"] == 1 and peak["b"] == 1
+    assert peak["total"] == 2
@@ -0,0 +1,45 @@
+"""Thread pool that runs simulation work off the asyncio event loop."""
+import asyncio
+import os
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+# Size of the shared pool; NumPy and the numba kernels release the GIL while
+# stepping, so sessions spread across cores.
+SIM_WORKERS = int(os.environ.get("SIM_WORKERS", 0)) or os.cpu_count() or 1
+
+
+class StepPool:
+    """A shared pool of worker threads for all sessions of the server."""
+
+    def __init__(self, max_workers: int = SIM_WORKERS):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix="sim-worker")
+
+    def session(self) -> "SessionWorker":
+        """Create the handle one session uses to submit work to the pool."""
+        return SessionWorker(self)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class SessionWorker:
+    """Submits the work of one session to a `StepPool`.
+
+    Jobs of one session run one at a time: they step and encode the same
+    simulation, which is not thread-safe. A heavy session therefore occupies at
+    most one worker and cannot starve the others.
+    """
+
+    def __init__(self, pool: StepPool):
+        self.pool = pool
+        self._lock = asyncio.Lock()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run `fn(*args)` on the pool and wait for its result."""
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.pool.executor, fn, *args)
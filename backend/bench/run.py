@@ -0,0 +1,263 @@
+"""Benchmark suite for the initialization, step and serialization hot paths.
+
+Run from `backend/`:
+
+    python -m bench.run --out bench/results/$(git rev-parse --short HEAD).json
+    python -m bench.run --quick --compare bench/results/main.json --plot scaling.png
+
+Every case is timed a few times and the median wall time is recorded. Results are
+written as JSON together with the commit they were measured on, so runs can be
+compared across commits with `--compare`.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+from collections.abc import Callable
+
+import numpy as np
+
+from app.main import encode_step
+from app.models.profiling import NULL_PROFILER
+from app.models.sim import AGENT_MASS, AGENT_R, AGENT_TAU, AGENT_V_DES, Agent, Simulation
+from app.models.state import AgentState
+from app.models.utils import flow_field, obstacle_distance_grid, wall_distance_grid
+from app.protocol import encode_frame
+
+AGENT_COUNTS = [100, 500, 1000, 2000, 5000, 10000, 20000]
+GRID_SIZES = [(40, 50), (100, 125), (200, 250), (400, 500)]
+OBSTACLE_COUNTS = [1, 2, 4]
+
+
+def measure(fn: Callable[[], object], repeat: int = 5) -> float:
+    """Median wall time of `fn` over `repeat` calls [second]."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def crowd(sim: Simulation, num_agents: int, seed: int = 0):
+    """Replace the agents of `sim` with `num_agents` agents spread over free cells.
+
+    `Simulation` places at most one agent per cell; benchmarks need denser crowds.
+    """
+    rng = np.random.default_rng(seed)
+    free = np.argwhere(sim.grid == 0)
+    cells = free[rng.integers(0, len(free), num_agents)]
+    positions = (cells + rng.uniform(0, 1, (num_agents, 2))) * sim.scenario.grid_size
+    sim.agent_state = AgentState.spawn(cells, positions, r=AGENT_R, m=AGENT_MASS,
+                                       tau=AGENT_TAU, v_des=AGENT_V_DES)
+    sim.agents = [Agent.view(sim.agent_state, i) for i in range(num_agents)]
+    sim.num_agents = num_agents
+    sim.compact()
+
+
+def random_grid(shape: tuple[int, int], rng: random.Random) -> np.ndarray:
+    """An empty grid with an exit on the right wall and a few blocks of obstacles."""
+    rows, cols = shape
+    grid = np.zeros(shape, dtype=np.int8)
+    grid[rows // 3:2 * rows // 3, -1] = 1
+    for _ in range(4):
+        h, w = rng.randint(rows // 10, rows // 5), rng.randint(cols // 10, cols // 5)
+        r, c = rng.randint(0, rows - h), rng.randint(0, cols - w - 2)
+        grid[r:r + h, c:c + w] = -1
+    return grid
+
+
+def bench_fields(repeat: int) -> dict:
+    results = {}
+    rng = random.Random(0)
+    for shape in GRID_SIZES:
+        grid = random_grid(shape, rng)
+        results[f"{shape[0]}x{shape[1]}"] = {
+            "flow_field": measure(lambda: flow_field(grid), repeat),
+            "wall_distance_grid": measure(lambda: wall_distance_grid(grid), repeat),
+        }
+    return results
+
+
+def bench_init(repeat: int) -> dict:
+    results = {}
+    for num_obstacles in OBSTACLE_COUNTS:
+        sim = Simulation(10, num_obstacles, True, field_cache=None, seed=0)
+        results[num_obstacles] = {
+            "simulation_init": measure(
+                lambda n=num_obstacles: Simulation(10, n, True, field_cache=None,
+                                                   seed=0).build_fields(),
+                repeat),
+            "obstacle_distance_grid": measure(
+                lambda s=sim: obstacle_distance_grid(s.grid, s.obstacles), repeat),
+        }
+    return results
+
+
+def bench_step(agent_counts: list[int], backend: str, repeat: int) -> dict:
+    results = {}
+    for num_agents in agent_counts:
+        sim = Simulation(10, 2, True, backend=backend, seed=0)
+        crowd(sim, num_agents)
+        sim.step()  # warm up (and compile, for numba)
+        results[num_agents] = measure(sim.step, repeat)
+    return results
+
+
+# integrators compared by wall time per simulated second
+INTEGRATION = {
+    "euler": {"integrator": "euler"},
+    "verlet_0.01": {"integrator": "verlet", "dt": 0.01},
+    "adaptive_verlet_0.05": {"integrator": "verlet", "dt": 0.05, "adaptive": True},
+}
+
+
+def bench_integration(num_agents: int, repeat: int, duration: float = 0.2) -> dict:
+    results = {}
+    for name, options in INTEGRATION.items():
+        def simulate():
+            sim = Simulation(10, 2, True, seed=0, **options)
+            crowd(sim, num_agents)
+            while sim.time < duration - 1e-9:
+                sim.step()
+
+        results[name] = measure(simulate, repeat) / duration
+    return results
+
+
+def bench_serialization(agent_counts: list[int], repeat: int) -> dict:
+    results = {}
+    for num_agents in agent_counts:
+        sim = Simulation(10, 2, True, seed=0)
+        crowd(sim, num_agents)
+        session = {"simulation": sim, "frame": 0, "delta": None, "precision": "int16",
+                   "profiler": NULL_PROFILER}
+
+        def dto_json():
+            session["protocol"] = "json"
+            json.dumps(encode_step(session))
+
+        results[num_agents] = {
+            "dto_json": measure(dto_json, repeat),
+            "binary_frame": measure(lambda s=sim: encode_frame(s, 0), repeat),
+        }
+    return results
+
+
+def bench_path_image(repeat: int) -> dict:
+    sim = Simulation(10, 2, True, seed=0)
+
+    def cold():
+        sim._path_colors = sim._path_image = None
+        sim.get_path_image()
+
+    return {"cold": measure(cold, repeat), "memoized": measure(sim.get_path_image, repeat)}
+
+
+def run(quick: bool = False) -> dict:
+    """Run the whole suite and return the results with run metadata."""
+    repeat = 3 if quick else 7
+    agent_counts = AGENT_COUNTS[:4] if quick else AGENT_COUNTS
+    results = {
+        "fields": bench_fields(repeat),
+        "init": bench_init(repeat),
+        "step": {backend: bench_step(agent_counts, backend, repeat)
+                 for backend in ("numpy", "numba")},
+        "integration": bench_integration(1000, repeat),
+        "serialization": bench_serialization(agent_counts, repeat),
+        "get_path_image": bench_path_image(repeat),
+    }
+    return {"meta": metadata(), "results": results}
+
+
+def metadata() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    """Flatten nested results into {"step/numpy/1000": seconds, ...}."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}/{key}" if prefix else str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        else:
+            flat[name] = value
+    return flat
+
+
+def compare(current: dict, baseline: dict):
+    """Print the timings of two runs side by side."""
+    now, before = flatten(current["results"]), flatten(baseline["results"])
+    print(f"{'case':<45} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for name, seconds in now.items():
+        if name in before:
+            ratio = seconds / before[name] if before[name] else float("nan")
+            print(f"{name:<45} {before[name] * 1e3:>10.3f}ms {seconds * 1e3:>10.3f}ms "
+                  f"{ratio:>7.2f}x")
+
+
+def plot(current: dict, path: str):
+    """Plot how each stage scales with the number of agents."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    results = current["results"]
+    fig, ax = plt.subplots(figsize=(7, 5))
+    for backend, timings in results["step"].items():
+        counts = [int(n) for n in timings]
+        ax.loglog(counts, list(timings.values()), "o-", label=f"step ({backend})")
+    for stage in ("dto_json", "binary_frame"):
+        timings = results["serialization"]
+        counts = [int(n) for n in timings]
+        ax.loglog(counts, [timings[n][stage] for n in timings], "s--", label=stage)
+    ax.set_xlabel("agents")
+    ax.set_ylabel("wall time per call [s]")
+    ax.set_title(f"commit {current['meta']['commit']}")
+    ax.legend()
+    fig.savefig(path, dpi=120, bbox_inches="tight")
+
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare with")
+    parser.add_argument("--plot", help="save a scaling plot to this image file")
+    parser.add_argument("--quick", action="store_true", help="fewer repeats and sizes")
+    args = parser.parse_args(argv)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+
+    current = run(quick=args.quick)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(current, json.load(f))
+    else:
+        for name, seconds in flatten(current["results"]).items():
+            print(f"{name:<45} {seconds * 1e3:>10.3f}ms")
+    if args.plot:
+        plot(current, args.plot)
+
+
+if __name__ == "__main__":
+    main()
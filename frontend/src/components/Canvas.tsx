@@ -1,5 +1,5 @@
 import { Stage, Layer, Rect, Circle } from "react-konva";
-import { SimulationState, Agent } from "../hooks/useSimulation";
+import { SimulationState, Scenario, Agent } from "../hooks/useSimulation";
 
 const hashCode = (str: string): number => {
   let hash = 0;
@@ -12,31 +12,43 @@ const hashCode = (str: string): number => {
 
 const Canvas = ({
   simulationState,
+  scenario,
   pathImage,
   showPath,
 }: {
   simulationState: SimulationState;
+  scenario: Scenario;
   pathImage: string[];
   showPath: boolean;
 }) => {
+  const cols = scenario.width / scenario.grid_size;
   return (
-    <Stage width={500} height={400}>
+    <Stage width={scenario.width} height={scenario.height}>
       <Layer>
         {showPath &&
           pathImage.map((color, index) => (
             <Rect
               key={index}
-              x={(index % 50) * 10}
-              y={Math.floor(index / 50) * 10}
-              width={10}
-              height={10}
+              x={(index % cols) * scenario.grid_size}
+              y={Math.floor(index / cols) * scenario.grid_size}
+              width={scenario.grid_size}
+              height={scenario.grid_size}
               fill={color}
               opacity={0.5}
             />
           ))}
       </Layer>
       <Layer>
-        <Rect x={490} y={150} width={10} height={100} fill="green" />
+        {scenario.exits.map(([x, y, width, height], index) => (
+          <Rect
+            key={`exit-${index}`}
+            x={x}
+            y={y}
+            width={width}
+            height={height}
+            fill="green"
+          />
+        ))}
         {simulationState.obstacles.map((obstacle, index) => (
           <Rect
             key={index}
@@ -11,9 +11,11 @@ const Sim = () => {
 
   const {
     simulationState,
+    scenario,
     pathImage,
     initializeSimulation,
-    stepSimulation,
+    runSimulation,
+    pauseSimulation,
     getPath,
   } = useSimulation();
 
@@ -41,14 +43,13 @@ const Sim = () => {
   //   };
   // }, [simStarted]);
 
+  // the server advances the simulation and streams frames while running
   useEffect(() => {
-    const animate = () => {
-      for (let i = 0; i < 10; i++) {
-        stepSimulation();
-      }
-    };
-    const interval = setInterval(animate, 0.1);
-    return () => clearInterval(interval);
+    if (simStarted) {
+      runSimulation();
+    } else {
+      pauseSimulation();
+    }
   }, [simStarted]);
 
   const [showPath, setShowPath] = useState(false);
@@ -64,6 +65,7 @@ const Sim = () => {
       <Container width="100%" padding={0} border="1px solid black">
         <Canvas
           simulationState={simulationState}
+          scenario={scenario}
           pathImage={pathImage}
           showPath={showPath}
         />
@@ -22,13 +22,38 @@ interface SimulationState {
   state: boolean;
 }
 
+// [x, y, width, height] on canvas
+type Rect = [number, number, number, number];
+
+interface Scenario {
+  width: number;
+  height: number;
+  grid_size: number;
+  exits: Rect[];
+  obstacles: Rect[] | null;
+  nearest_obstacles: number | null;
+}
+
 interface SimulationConfig {
   numAgents: number;
   numObstacles: number;
   state: boolean;
+  // a scenario object, or the name of a scenario file on the server
+  scenario?: Scenario | string;
 }
 
-export type { SimulationState, SimulationConfig, Agent, Obstacle };
+// the world the server simulates when no scenario is given
+const DEFAULT_SCENARIO: Scenario = {
+  width: 500,
+  height: 400,
+  grid_size: 10,
+  exits: [[490, 140, 10, 110]],
+  obstacles: null,
+  nearest_obstacles: 4,
+};
+
+export type { SimulationState, SimulationConfig, Scenario, Agent, Obstacle };
+export { DEFAULT_SCENARIO };
 
 const wsProtocol = window.location.protocol === "https:" ? "wss:" : "ws:";
 const wsHost = window.location.host;
@@ -36,6 +61,67 @@ const wsHost = window.location.host;
 const WS_BASE_URL = `${wsProtocol}//${wsHost}/ws`;
 // const WS_BASE_URL_LOCAL = "ws://localhost:8000/ws";
 
+// Binary step frames; see backend/app/protocol.py for the layout.
+const FRAME = 1;
+const DELTA = 2;
+const FRAME_HEADER_BYTES = 12;
+const FLAG_RUNNING = 1 << 0;
+const FLAG_FLOAT32 = 1 << 1;
+
+const decodeFrame = (
+  buffer: ArrayBuffer,
+  prev: SimulationState
+): SimulationState => {
+  const view = new DataView(buffer);
+  const type = view.getUint8(0);
+  if (type !== FRAME && type !== DELTA) {
+    return prev;
+  }
+  const flags = view.getUint16(2, true);
+  const count = view.getUint32(8, true);
+  let offset = FRAME_HEADER_BYTES;
+  // delta frames list the agents they carry; full frames carry all of them
+  const indices =
+    type === DELTA ? new Uint32Array(buffer, offset, count) : null;
+  offset += indices ? indices.byteLength : 0;
+  const positions =
+    flags & FLAG_FLOAT32
+      ? new Float32Array(buffer, offset, count * 2)
+      : new Int16Array(buffer, offset, count * 2);
+  offset += positions.byteLength;
+  const exited = new Uint8Array(buffer, offset, Math.ceil(count / 8));
+
+  const agents = prev.agents.slice();
+  for (let k = 0; k < count; k++) {
+    const i = indices ? indices[k] : k;
+    if (i >= agents.length) {
+      continue;
+    }
+    agents[i] = {
+      ...agents[i],
+      position: { x: positions[2 * k], y: positions[2 * k + 1] },
+      exited: ((exited[k >> 3] >> (k & 7)) & 1) === 1,
+    };
+  }
+  return {
+    ...prev,
+    agents,
+    state: (flags & FLAG_RUNNING) !== 0,
+  };
+};
+
+const applyDelta = (
+  delta: { agents: Agent[]; state: boolean },
+  prev: SimulationState
+): SimulationState => {
+  const changed = new Map(delta.agents.map((agent) => [agent.id, agent]));
+  return {
+    ...prev,
+    agents: prev.agents.map((agent) => changed.get(agent.id) ?? agent),
+    state: delta.state,
+  };
+};
+
 export const useSimulation = () => {
   const [simulationState, setSimulationState] = useState<SimulationState>({
     agents: [],
@@ -43,21 +129,39 @@ export const useSimulation = () => {
     state: true,
   });
 
+  const [scenario, setScenario] = useState<Scenario>(DEFAULT_SCENARIO);
   const [pathImage, setPathImage] = useState<string[]>([]);
   const wsRef = useRef<WebSocket | null>(null);
 
+  const handleMessage = (event: MessageEvent) => {
+    if (event.data instanceof ArrayBuffer) {
+      const buffer = event.data;
+      setSimulationState((prev) => decodeFrame(buffer, prev));
+      return;
+    }
+    const data = JSON.parse(event.data);
+    if (data.type === "path_image") {
+      setPathImage(data.data);
+    } else if (data.type === "simulation_state") {
+      if (data.data.scenario) {
+        setScenario(data.data.scenario);
+      }
+      setSimulationState(data.data);
+    } else if (data.type === "simulation_delta") {
+      setSimulationState((prev) => applyDelta(data.data, prev));
+    }
+  };
+
+  const openSocket = () => {
+    const ws = new WebSocket(WS_BASE_URL);
+    ws.binaryType = "arraybuffer";
+    ws.onmessage = handleMessage;
+    return ws;
+  };
+
   // Initialize WebSocket connection
   useEffect(() => {
-    wsRef.current = new WebSocket(WS_BASE_URL);
-
-    wsRef.current.onmessage = (event) => {
-      const data = JSON.parse(event.data);
-      if (data.type === "path_image") {
-        setPathImage(data.data);
-      } else if (data.type === "simulation_state") {
-        setSimulationState(data.data);
-      }
-    };
+    wsRef.current = openSocket();
 
     return () => {
       wsRef.current?.close();
@@ -67,7 +171,7 @@ export const useSimulation = () => {
   const initializeSimulation = (config: SimulationConfig) => {
     // Create new WebSocket if closed or doesn't exist
     if (!wsRef.current || wsRef.current.readyState === WebSocket.CLOSED) {
-      wsRef.current = new WebSocket(WS_BASE_URL);
+      wsRef.current = openSocket();
 
       // Wait for connection to open before sending data
       wsRef.current.onopen = () => {
@@ -75,25 +179,19 @@ export const useSimulation = () => {
           JSON.stringify({
             type: "init",
             data: config,
+            protocol: "binary",
+            delta: true,
           })
         );
       };
-
-      // Reattach message handler
-      wsRef.current.onmessage = (event) => {
-        const data = JSON.parse(event.data);
-        if (data.type === "path_image") {
-          setPathImage(data.data);
-        } else if (data.type === "simulation_state") {
-          setSimulationState(data.data);
-        }
-      };
     } else if (wsRef.current.readyState === WebSocket.OPEN) {
       // If connection is already open, just send the data
       wsRef.current.send(
         JSON.stringify({
           type: "init",
           data: config,
+          protocol: "binary",
+          delta: true,
         })
       );
     }
@@ -109,6 +207,46 @@ export const useSimulation = () => {
     }
   };
 
+  const runSimulation = (substeps = 10, fps = 30) => {
+    if (wsRef.current?.readyState === WebSocket.OPEN) {
+      wsRef.current.send(
+        JSON.stringify({
+          type: "run",
+          substeps,
+          fps,
+        })
+      );
+    }
+  };
+
+  const pauseSimulation = () => {
+    if (wsRef.current?.readyState === WebSocket.OPEN) {
+      wsRef.current.send(
+        JSON.stringify({
+          type: "pause",
+        })
+      );
+    }
+  };
+
+  const send = (message: object) => {
+    if (wsRef.current?.readyState === WebSocket.OPEN) {
+      wsRef.current.send(JSON.stringify(message));
+    }
+  };
+
+  // record the running simulation on the server, every `every` steps
+  const startRecording = (name?: string, every = 10) =>
+    send({ type: "record", name, every });
+
+  const stopRecording = () => send({ type: "stop_recording" });
+
+  // play a recording back through the same frame stream as a simulation
+  const replayRecording = (name: string) =>
+    send({ type: "replay", name, protocol: "binary", delta: true });
+
+  const seekReplay = (frame: number) => send({ type: "seek", frame });
+
   const getPath = () => {
     if (simulationState.agents.length === 0) {
       return;
@@ -123,9 +261,16 @@ export const useSimulation = () => {
 
   return {
     simulationState,
+    scenario,
     pathImage,
     initializeSimulation,
     stepSimulation,
+    runSimulation,
+    pauseSimulation,
+    startRecording,
+    stopRecording,
+    replayRecording,
+    seekReplay,
     getPath,
   };
 };